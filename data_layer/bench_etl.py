@@ -0,0 +1,97 @@
+# Micro-benchmark de las etapas del ETL (extraccion, embeddings y upsert) sobre
+# una muestra de los csv. El upsert se mide contra un Chroma en memoria
+# (EphemeralClient) para no tocar la coleccion real, salvo que se pase --host.
+#
+# Uso (desde data_layer/):
+#   python bench_etl.py --rows 5000 --batch-sizes 32 128 512 --output etl_bench.json
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import chromadb
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+
+from etl_script import files_config, extract_chunk, MODEL_NAME
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de las etapas del ETL")
+    parser.add_argument("--rows", type=int, default=5000, help="Filas de muestra por archivo")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 128, 512])
+    parser.add_argument("--upsert-batch", type=int, default=2000)
+    parser.add_argument("--host", help="Servidor Chroma real (por defecto: en memoria)")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    return parser.parse_args()
+
+def rate(rows, seconds):
+    return {"rows": rows, "seconds": round(seconds, 3), "rows_per_sec": round(rows / seconds, 1) if seconds else None}
+
+def main():
+    args = parse_args()
+    results = {"config": vars(args)}
+    try:
+        results["commit"] = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        results["commit"] = None
+
+    # --- EXTRACCION ---
+    ids, documents, metadatas = [], [], []
+    start = time.perf_counter()
+    rows_read = 0
+    for item in files_config:
+        if not os.path.exists(item["path"]):
+            continue
+        df = pd.read_csv(item["path"], nrows=args.rows)
+        rows_read += len(df)
+        chunk_ids, chunk_docs, chunk_meta = extract_chunk(df, item["tag"], item["type"])
+        ids.extend(chunk_ids)
+        documents.extend(chunk_docs)
+        metadatas.extend(chunk_meta)
+    results["extract"] = rate(rows_read, time.perf_counter() - start)
+    print(f"📂 Extracción: {results['extract']}")
+
+    # --- EMBEDDINGS ---
+    model = SentenceTransformer(MODEL_NAME)
+    model.encode(documents[:32])  # calentamiento
+    results["encode"] = {}
+    embeddings = None
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        embeddings = model.encode(documents, batch_size=batch_size)
+        results["encode"][str(batch_size)] = rate(len(documents), time.perf_counter() - start)
+        print(f"🧠 Embeddings (batch {batch_size}): {results['encode'][str(batch_size)]}")
+
+    # --- UPSERT ---
+    client = chromadb.HttpClient(host=args.host, port=8000) if args.host else chromadb.EphemeralClient()
+    collection_name = "etl_benchmark"
+    try:
+        client.delete_collection(collection_name)
+    except Exception:
+        pass
+    collection = client.create_collection(collection_name)
+    embeddings = embeddings.tolist()
+    start = time.perf_counter()
+    for i in range(0, len(ids), args.upsert_batch):
+        end = i + args.upsert_batch
+        collection.upsert(ids=ids[i:end], documents=documents[i:end],
+                          embeddings=embeddings[i:end], metadatas=metadatas[i:end])
+    results["upsert"] = rate(len(ids), time.perf_counter() - start)
+    print(f"⬆️  Upsert: {results['upsert']}")
+    client.delete_collection(collection_name)
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["peak_rss_mb"] = round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Resultados guardados en {args.output}")
+
+if __name__ == "__main__":
+    main()
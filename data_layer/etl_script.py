@@ -1,154 +1,410 @@
 # Este archivo se encarga de extraer los datos de los csv para transformarlos en
-# embbedings que se puedan subir a la base de datos. Este archivo solo se debe
-# ejecutar una vez.
+# embbedings que se puedan subir a la base de datos. La ingesta es incremental:
+# se puede ejecutar las veces que sea necesario y solo se codifican las filas
+# nuevas o modificadas. Si el proceso se cae, la siguiente ejecucion retoma
+# desde el ultimo bloque confirmado en el archivo de checkpoint.
+#
+# Uso:
+#   python etl_script.py              -> ingesta incremental (reanuda si hay checkpoint)
+#   python etl_script.py --rebuild    -> borra la coleccion y la crea desde cero
+#   python etl_script.py --prune      -> ademas elimina documentos que ya no estan en los csv
 
 import pandas as pd
 import chromadb
 from sentence_transformers import SentenceTransformer
+import argparse
+import hashlib
+import json
 import os
+import queue
 import sys
-from tqdm import tqdm
+import threading
+import time
+
+# El almacen de embeddings, el calculo de clusters de casi-duplicados y el de
+# centroides por particion viven en la capa logica porque tambien los usa agents.py (y es lo unico que se copia a su
+# contenedor); aqui los importamos desde el repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logic_layer"))
+from embedding_store import EmbeddingStore
+from diversity import dup_cluster_id
+from centroids import CENTROID_COLLECTION, compute_source_centroids, store_centroids
 
 # Se realiza una configuracion donde se agregan unos meta datos para definir
 # el contexto de cada agente segun sus personalidades y funciones. Posteriormente
 # se utiliza "tag" para saber a que agente le pertenecen esos datos.
 files_config = [
     {
-        "path": "datasets/Covid_final.csv", 
-        "tag": "survivor_context", 
+        "path": "datasets/Covid_final.csv",
+        "tag": "survivor_context",
         "type": "covid"
     },
     {
-        "path": "datasets/Disasters_final.csv", 
-        "tag": "survivor_context", 
+        "path": "datasets/Disasters_final.csv",
+        "tag": "survivor_context",
         "type": "disaster"
     },
     {
-        "path": "datasets/Stocks_final.csv", 
-        "tag": "speculator_context", 
+        "path": "datasets/Stocks_final.csv",
+        "tag": "speculator_context",
         "type": "market"
     },
     {
-        "path": "datasets/Kojima_final.csv", 
-        "tag": "auteur_context", 
+        "path": "datasets/Kojima_final.csv",
+        "tag": "auteur_context",
         "type": "social"
     }
 ]
 
-# Se realiza la conexion a la base de datos haciendo una conexion al contenedor
-# que se encuentra en el puerto especificado.
-print("⏳ Conectando a ChromaDB en Docker (localhost:8000)...")
-try:
-    client = chromadb.HttpClient(host='localhost', port=8000)
-    print("✅ Conexión exitosa con ChromaDB.")
-except Exception as e:
-    print(f"❌ Error conectando a ChromaDB. ¿Está corriendo el contenedor Docker? Error: {e}")
-    sys.exit(1)
-
-# Si la conexion es exitosa se procede a hacer la conversion de los datos a embbedings
-# para poder almacenarlos en la base de datos. Para la conversion se utiliza la
-# libreria SentenceTransformer de HuggingFace, donde se llama un modelo que convierta
-# los Tweets de los csv. Se utiliza este modelo pues esta enfocado en parrafos cortos
-# y frases, lo que aplica para los Tweets
-print("⏳ Cargando modelo de Embeddings (esto puede tardar un poco la primera vez)...")
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# Se verifica que la coleccion no exista para evitar problemas.
 COLLECTION_NAME = "project_archive"
-try:
-    client.delete_collection(COLLECTION_NAME)
-    print(f"🗑️ Colección '{COLLECTION_NAME}' anterior eliminada.")
-except:
-    pass
-
-# Se crea la nueva coleccion que contendra todos los datos.
-collection = client.create_collection(name=COLLECTION_NAME)
-print(f"✨ Nueva colección '{COLLECTION_NAME}' creada.")
-
-# Se realiza el proceso de ETL, se especifica que se haga en un batch de 500 poder
-# ver como evoluciona el proceso y verificr que no haya algun crash de la instancia
-# EC2.
-print("\n🚀 INICIANDO INGESTA DE DATOS...\n")
-BATCH_SIZE = 500
-
-# Se inicia el bucle principal, donde se reciben los metadatos asociados al inicio
-# del codigo de cada archivo csv. 
-for item in files_config:
-    file_path = item["path"]
-    tag = item["tag"]
-    data_type = item["type"]
-    
-    print(f"📂 Procesando archivo: {file_path} (Etiqueta: {tag})")  
-    if not os.path.exists(file_path):
-        print(f"   ⚠️ ALERTA: No se encontró el archivo {file_path}. Saltando...")
-        continue
-    try:
-        df = pd.read_csv(file_path)
-    except Exception as e:
-        print(f"   ❌ Error leyendo CSV: {e}")
-        continue
-
-    # Luego de encontrar el archivo se declaran las listas que contendran la
-    # informacion que se convertira a embbeding. Para encontrar la informacion
-    # se hace una pequeña busqueda dentro de las columnas del csv, aunque
-    # todas las columnas se llaman igual en todos los archivos, se agrega una
-    # opcion en caso de que se suba un csv con columnas que se llamen diferente.
-    all_ids = []
-    all_documents = []
-    all_metadatas = []
-
-    print(f"   ⚙️  Preparando datos de {len(df)} filas...")
-    count = 0
-    for index, row in df.iterrows():
-        text_content = row.get('tweet') or row.get('text') or row.get('content')
-        date_content = row.get('date') or row.get('timestamp')
-        loc_content = row.get('location') or row.get('place') or "Unknown"
-        
-        if not isinstance(text_content, str):
-            continue 
-            
-        meta = {
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "embedding_store")
+CHECKPOINT_FILE = os.getenv("ETL_CHECKPOINT_FILE", "etl_checkpoint.json")
+
+# Los csv se leen por bloques de CHUNK_SIZE filas para que la memoria se mantenga
+# plana sin importar el tamaño del archivo. Cada bloque es tambien la unidad de
+# upsert y de checkpoint. ENCODE_BATCH_SIZE es el batch interno del modelo.
+CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE", "2000"))
+ENCODE_BATCH_SIZE = int(os.getenv("ETL_ENCODE_BATCH_SIZE", "128"))
+QUEUE_DEPTH = 4
+
+# Nombres de columna aceptados para cada campo. Aunque todas las columnas se llaman
+# igual en todos los archivos, se deja la opcion por si se sube un csv distinto.
+TEXT_COLUMNS = ["tweet", "text", "content"]
+DATE_COLUMNS = ["date", "timestamp"]
+LOCATION_COLUMNS = ["location", "place"]
+
+# --- UTILIDADES ---
+
+class StageStats:
+    """Acumula filas procesadas y tiempo activo de una etapa del pipeline."""
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.seconds = 0.0
+
+    def add(self, rows, seconds):
+        self.rows += rows
+        self.seconds += seconds
+
+    def report(self):
+        rate = self.rows / self.seconds if self.seconds else 0.0
+        return f"{self.name}: {self.rows} filas en {self.seconds:.1f}s ({rate:.0f} filas/s)"
+
+def first_column(df, candidates):
+    for name in candidates:
+        if name in df.columns:
+            return df[name]
+    return None
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+def load_checkpoint():
+    if os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_checkpoint(checkpoint):
+    tmp_path = f"{CHECKPOINT_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+def content_id(data_type, tag, text, date):
+    """ID basado en el contenido: la misma fila siempre produce el mismo ID."""
+    digest = hashlib.sha1(f"{tag}\x1f{text}\x1f{date}".encode("utf-8")).hexdigest()[:20]
+    return f"{data_type}_{digest}"
+
+def date_buckets(dates):
+    """
+    Interpreta la columna de fechas (texto libre, p. ej. '2020/4/9 23:59') y
+    devuelve por fila (epoch en segundos UTC, mes AAAAMM, semana ISO AAAASS), o
+    None si la fecha no se puede leer. Son los campos numericos que la capa
+    logica usa para filtrar por periodo con `where` en Chroma.
+    """
+    parsed = pd.to_datetime(dates, errors="coerce", format="mixed", utc=True)
+    valid = parsed.notna().to_numpy()
+    epochs = parsed.dt.tz_convert(None).to_numpy(dtype="datetime64[s]").astype("int64")
+    months = (parsed.dt.year * 100 + parsed.dt.month).fillna(0).astype("int64").to_numpy()
+    iso = parsed.dt.isocalendar()
+    weeks = (iso["year"] * 100 + iso["week"]).fillna(0).astype("int64").to_numpy()
+    return [
+        (int(epoch), int(month), int(week)) if ok else None
+        for epoch, month, week, ok in zip(epochs, months, weeks, valid)
+    ]
+
+def extract_chunk(df, tag, data_type):
+    """
+    Extraccion por columnas (sin iterrows): devuelve ids, documentos y metadatos
+    de las filas con texto valido, sin duplicados dentro del bloque.
+    """
+    text = first_column(df, TEXT_COLUMNS)
+    if text is None:
+        return [], [], []
+    date = first_column(df, DATE_COLUMNS)
+    location = first_column(df, LOCATION_COLUMNS)
+
+    valid = text.map(lambda value: isinstance(value, str) and bool(value.strip()))
+    texts = text[valid].tolist()
+    dates = date[valid].astype(str).tolist() if date is not None else ["None"] * len(texts)
+    buckets = date_buckets(date[valid]) if date is not None else [None] * len(texts)
+    if location is not None:
+        locations = location[valid].fillna("Unknown").astype(str).tolist()
+    else:
+        locations = ["Unknown"] * len(texts)
+
+    rows = {}
+    for text_content, date_content, bucket, loc_content in zip(texts, dates, buckets, locations):
+        doc_id = content_id(data_type, tag, text_content, date_content)
+        metadata = {
             "source": tag,
             "type": data_type,
-            "date": str(date_content),
-            "location": str(loc_content)
+            "date": date_content,
+            "location": loc_content,
+            # Cluster de casi-duplicados (retweets, misma frase con otra URL): la
+            # capa logica se queda con un solo documento por cluster al consultar
+            "dup_cluster": dup_cluster_id(text_content)
         }
-        
-        unique_id = f"{data_type}_{index}"
-
-        all_ids.append(unique_id)
-        all_documents.append(text_content)
-        all_metadatas.append(meta)
-        count += 1
-
-    # Se generan los embbedings de todos los documentos que han sido guardados
-    # en las listas. Lo hace a traves de paquetes de longitud 500, donde se 
-    # registran las diferentes listas para codificar el texto principal y subir
-    # paquete con toda la informacion de cada entrada a ChromaDB
-    total_docs = len(all_documents)
-    if total_docs > 0:
-        print(f"   🧠 Generando embeddings e insertando en lotes de {BATCH_SIZE}...")
-        
-        for i in range(0, total_docs, BATCH_SIZE):
-            end_i = min(i + BATCH_SIZE, total_docs)
-            batch_docs = all_documents[i:end_i]
-            batch_ids = all_ids[i:end_i]
-            batch_meta = all_metadatas[i:end_i]
-            
-            batch_embeddings = embedding_model.encode(batch_docs).tolist()
-            
-            collection.add(
-                ids=batch_ids,
-                documents=batch_docs,
-                embeddings=batch_embeddings,
-                metadatas=batch_meta
-            )
-            
-            progress = (end_i / total_docs) * 100
-            print(f"      Status: {end_i}/{total_docs} ({progress:.2f}%) completado.")
-            
-        print(f"   ✅ Archivo completado exitosamente.")
-    else:
-        print("   ⚠️ El archivo estaba vacío o no contenía texto válido.")
+        if bucket is not None:
+            # Chroma no admite None en metadatos: sin fecha valida no hay campos de periodo
+            metadata["epoch"], metadata["month"], metadata["week"] = bucket
+        rows[doc_id] = (text_content, metadata)
+
+    ids = list(rows.keys())
+    documents = [rows[i][0] for i in ids]
+    metadatas = [rows[i][1] for i in ids]
+    return ids, documents, metadatas
+
+def main():
+    # --- ARGUMENTOS ---
+    parser = argparse.ArgumentParser(description="Ingesta de los csv en ChromaDB")
+    parser.add_argument("--rebuild", action="store_true", help="Eliminar la colección y crearla desde cero")
+    parser.add_argument("--prune", action="store_true", help="Eliminar documentos que ya no aparecen en los csv")
+    args = parser.parse_args()
+
+    # Se realiza la conexion a la base de datos haciendo una conexion al contenedor
+    # que se encuentra en el puerto especificado.
+    print("⏳ Conectando a ChromaDB en Docker (localhost:8000)...")
+    try:
+        client = chromadb.HttpClient(host='localhost', port=8000)
+        print("✅ Conexión exitosa con ChromaDB.")
+    except Exception as e:
+        print(f"❌ Error conectando a ChromaDB. ¿Está corriendo el contenedor Docker? Error: {e}")
+        sys.exit(1)
+
+    # Si la conexion es exitosa se procede a hacer la conversion de los datos a embbedings
+    # para poder almacenarlos en la base de datos. Para la conversion se utiliza la
+    # libreria SentenceTransformer de HuggingFace, donde se llama un modelo que convierta
+    # los Tweets de los csv. Se utiliza este modelo pues esta enfocado en parrafos cortos
+    # y frases, lo que aplica para los Tweets
+    print("⏳ Cargando modelo de Embeddings (esto puede tardar un poco la primera vez)...")
+    embedding_model = SentenceTransformer(MODEL_NAME)
+
+    # Los textos que ya se codificaron en una ejecucion anterior (aunque sea contra
+    # otro servidor Chroma o antes de un --rebuild) se leen del almacen local.
+    embedding_store = EmbeddingStore(EMBEDDING_STORE_DIR, MODEL_NAME, embedding_model.get_sentence_embedding_dimension())
+    print(f"💾 Almacén de embeddings: {len(embedding_store)} vectores guardados.")
+
+    # Solo con --rebuild se borra la coleccion; por defecto se reutiliza y se hace
+    # upsert incremental sobre ella.
+    if args.rebuild:
+        try:
+            client.delete_collection(COLLECTION_NAME)
+            print(f"🗑️ Colección '{COLLECTION_NAME}' anterior eliminada.")
+        except Exception:
+            pass
+        try:
+            client.delete_collection(CENTROID_COLLECTION)
+        except Exception:
+            pass
+        if os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)
+
+    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    print(f"✨ Colección '{COLLECTION_NAME}' lista ({collection.count()} documentos actuales).")
+
+    checkpoint = load_checkpoint()
+
+    # --- PIPELINE PRODUCTOR / CONSUMIDOR ---
+    # Hilo principal: lee el csv por bloques, extrae columnas y descarta las filas que
+    #                 ya estan en Chroma (mismo ID de contenido).
+    # Hilo encoder:   calcula los embeddings del bloque.
+    # Hilo upserter:  sube el bloque a Chroma y confirma el checkpoint.
+    # Asi la codificacion del bloque N+1 se solapa con el upsert del bloque N.
+    # Las colas son acotadas para que la memoria no crezca si una etapa se atrasa.
+    read_stats = StageStats("Lectura/extracción")
+    encode_stats = StageStats("Embeddings")
+    upsert_stats = StageStats("Upsert")
+
+    encode_queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    upsert_queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    pipeline_errors = []
+    STOP = object()
+
+    def encoder_worker():
+        while True:
+            work = encode_queue.get()
+            if work is STOP:
+                upsert_queue.put(STOP)
+                return
+            if pipeline_errors:
+                continue  # Drenamos la cola para que el productor no se bloquee
+            try:
+                start = time.perf_counter()
+                if work["documents"]:
+                    work["embeddings"] = embedding_store.encode(
+                        work["documents"],
+                        lambda docs: embedding_model.encode(docs, batch_size=ENCODE_BATCH_SIZE)
+                    ).tolist()
+                encode_stats.add(len(work["documents"]), time.perf_counter() - start)
+                upsert_queue.put(work)
+            except Exception as e:
+                pipeline_errors.append(e)
+
+    def upsert_worker():
+        while True:
+            work = upsert_queue.get()
+            if work is STOP:
+                return
+            if pipeline_errors:
+                continue
+            try:
+                start = time.perf_counter()
+                if work["ids"]:
+                    collection.upsert(
+                        ids=work["ids"],
+                        documents=work["documents"],
+                        embeddings=work["embeddings"],
+                        metadatas=work["metadatas"]
+                    )
+                upsert_stats.add(len(work["ids"]), time.perf_counter() - start)
+
+                # El checkpoint solo avanza cuando el bloque ya esta confirmado en Chroma.
+                # Al terminar el archivo se borra su entrada: la proxima corrida lo
+                # recorre completo (y --prune sigue disponible).
+                if work.get("complete"):
+                    checkpoint.pop(work["file"], None)
+                    save_checkpoint(checkpoint)
+                    continue
+                checkpoint[work["file"]] = {"rows_done": work["rows_done"], "fingerprint": work["fingerprint"]}
+                save_checkpoint(checkpoint)
+                print(f"      Status: {work['rows_done']} filas leídas de {work['file']} "
+                      f"(+{len(work['ids'])} nuevas) confirmado.")
+            except Exception as e:
+                pipeline_errors.append(e)
+
+    encoder_thread = threading.Thread(target=encoder_worker, name="etl-encoder", daemon=True)
+    upsert_thread = threading.Thread(target=upsert_worker, name="etl-upsert", daemon=True)
+    encoder_thread.start()
+    upsert_thread.start()
+
+    print("\n🚀 INICIANDO INGESTA DE DATOS...\n")
+    seen_ids = {}
+    # Tipos cuyo csv se leyo completo desde la primera fila: los unicos que --prune
+    # puede limpiar sin borrar documentos que simplemente no se alcanzaron a leer
+    complete_types = set()
+    total_start = time.perf_counter()
+
+    # Se inicia el bucle principal, donde se reciben los metadatos asociados al inicio
+    # del codigo de cada archivo csv.
+    for item in files_config:
+        file_path = item["path"]
+        tag = item["tag"]
+        data_type = item["type"]
+
+        print(f"📂 Procesando archivo: {file_path} (Etiqueta: {tag})")
+        if not os.path.exists(file_path):
+            print(f"   ⚠️ ALERTA: No se encontró el archivo {file_path}. Saltando...")
+            continue
+
+        # Si el archivo no cambio desde el ultimo checkpoint, se retoma donde quedo.
+        # Solo hay entrada mientras un archivo esta a medias (se borra al terminarlo).
+        fingerprint = file_fingerprint(file_path)
+        previous = checkpoint.get(file_path)
+        rows_done = previous["rows_done"] if previous and previous["fingerprint"] == fingerprint else 0
+        resumed = rows_done > 0
+        if resumed:
+            print(f"   ⏩ Reanudando desde la fila {rows_done} (checkpoint).")
+        seen_ids[data_type] = set()
+
+        try:
+            reader = pd.read_csv(file_path, chunksize=CHUNK_SIZE, skiprows=range(1, rows_done + 1))
+            for chunk in reader:
+                if pipeline_errors:
+                    break
+                start = time.perf_counter()
+                rows_done += len(chunk)
+                ids, documents, metadatas = extract_chunk(chunk, tag, data_type)
+                seen_ids[data_type].update(ids)
+
+                # Solo se codifican las filas cuyo ID de contenido aun no existe
+                try:
+                    existing = set(collection.get(ids=ids, include=[])["ids"]) if ids else set()
+                except Exception as e:
+                    pipeline_errors.append(e)  # Error de Chroma: detiene la ingesta
+                    break
+                new_rows = [i for i, doc_id in enumerate(ids) if doc_id not in existing]
+                read_stats.add(len(chunk), time.perf_counter() - start)
+
+                encode_queue.put({
+                    "file": file_path,
+                    "fingerprint": fingerprint,
+                    "rows_done": rows_done,
+                    "ids": [ids[i] for i in new_rows],
+                    "documents": [documents[i] for i in new_rows],
+                    "metadatas": [metadatas[i] for i in new_rows],
+                    "embeddings": []
+                })
+            if not pipeline_errors:
+                encode_queue.put({"file": file_path, "complete": True, "ids": [], "documents": []})
+                if not resumed:
+                    complete_types.add(data_type)
+        except Exception as e:
+            # El archivo quedo a medias: su tipo no se poda en esta corrida
+            print(f"   ❌ Error leyendo CSV: {e}")
+            continue
+
+    encode_queue.put(STOP)
+    encoder_thread.join()
+    upsert_thread.join()
+
+    if pipeline_errors:
+        print(f"\n❌ La ingesta se detuvo por un error: {pipeline_errors[0]}")
+        print("   Vuelve a ejecutar el script para reanudar desde el último checkpoint.")
+        sys.exit(1)
+
+    # Con --prune se eliminan los documentos de cada tipo que ya no estan en los csv.
+    # Solo es seguro para los tipos recorridos completos (sin reanudar desde un
+    # checkpoint y sin errores de lectura a mitad del archivo).
+    if args.prune:
+        for data_type, ids in seen_ids.items():
+            if data_type not in complete_types:
+                print(f"⚠️ --prune se omite para '{data_type}': su csv no se leyó completo en esta ejecución.")
+                continue
+            stored = collection.get(where={"type": data_type}, include=[])["ids"]
+            stale = [doc_id for doc_id in stored if doc_id not in ids]
+            if stale:
+                collection.delete(ids=stale)
+                print(f"   🧹 {len(stale)} documentos obsoletos de '{data_type}' eliminados.")
+
+    # Centroide de cada particion para RETRIEVAL_QUERY_MODE=centroid en la capa
+    # logica. Se recalculan en cada corrida: la ingesta incremental (o --prune)
+    # pudo cambiar cualquier particion.
+    start = time.perf_counter()
+    centroids = compute_source_centroids(collection, list(dict.fromkeys(item["tag"] for item in files_config)))
+    store_centroids(client, centroids)
+    print(f"🎯 Centroides de {len(centroids)} particiones guardados en '{CENTROID_COLLECTION}' "
+          f"({time.perf_counter() - start:.1f}s).")
+
+    print("\n📊 RENDIMIENTO POR ETAPA")
+    for stats in (read_stats, encode_stats, upsert_stats):
+        print(f"   {stats.report()}")
+    print(f"   Total: {time.perf_counter() - total_start:.1f}s")
+    print(f"   Almacén de embeddings: {embedding_store.hits} reutilizados, {embedding_store.misses} codificados con el modelo.")
+
+    print("\n🏁 PROCESO COMPLETADO. La base de datos está lista.")
 
-print("\n🏁 PROCESO COMPLETADO. La base de datos está lista.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# Este archivo exporta e importa la coleccion de ChromaDB como un snapshot
+# compacto, para levantar un ambiente nuevo sin correr el ETL completo (ni
+# cargar el modelo de embeddings): importar solo sube los vectores ya calculados.
+#
+# El snapshot es un zip con un manifiesto y, por cada pagina de la coleccion,
+# un .npy con los embeddings float32 y un .json comprimido con ids, documentos
+# y metadatos:
+#   manifest.json
+#   project_archive/00000.npy   project_archive/00000.json
+#   project_archive/00001.npy   ...
+# La exportacion lee la coleccion por paginas (collection.get con offset), asi
+# la memoria no depende del tamaño de la coleccion. Tambien se exportan los
+# centroides por particion que calcula el ETL, si existen.
+#
+# Uso (desde data_layer/, con el contenedor de Chroma corriendo):
+#   python snapshot.py export project_archive.zip
+#   python snapshot.py import project_archive.zip             -> upsert sobre lo existente
+#   python snapshot.py import project_archive.zip --replace   -> borra y recrea las colecciones
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import chromadb
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logic_layer"))
+from centroids import CENTROID_COLLECTION
+
+COLLECTION_NAME = "project_archive"
+SNAPSHOT_FORMAT = 1
+PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "5000"))
+# Filas por llamada a upsert y llamadas simultaneas al servidor al importar
+UPSERT_BATCH_SIZE = int(os.getenv("SNAPSHOT_UPSERT_BATCH", "5000"))
+UPSERT_WORKERS = int(os.getenv("SNAPSHOT_UPSERT_WORKERS", "4"))
+
+def report(action, name, rows, seconds):
+    rate = rows / seconds if seconds else 0.0
+    print(f"   📊 {action} '{name}': {rows} filas en {seconds:.1f}s ({rate:.0f} filas/s)")
+
+# --- EXPORTACION ---
+
+def export_collection(collection, archive, page_size, compression_level):
+    """
+    Escribe la coleccion en el zip pagina por pagina. Mientras se comprime una
+    pagina ya se esta pidiendo la siguiente al servidor.
+    """
+    def fetch(offset):
+        return collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+
+    chunks = []
+    rows = 0
+    dim = None
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        pending = prefetch.submit(fetch, 0)
+        while pending is not None:
+            page = pending.result()
+            ids = page["ids"]
+            if not ids:
+                break
+            pending = prefetch.submit(fetch, rows + len(ids)) if len(ids) == page_size else None
+
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            dim = embeddings.shape[1]
+            name = f"{collection.name}/{len(chunks):05d}"
+            buffer = io.BytesIO()
+            np.save(buffer, embeddings)
+            # Los float32 casi no se comprimen: se guardan tal cual para no gastar CPU
+            archive.writestr(f"{name}.npy", buffer.getvalue(), compress_type=zipfile.ZIP_STORED)
+            records = {"ids": ids, "documents": page.get("documents"), "metadatas": page.get("metadatas")}
+            archive.writestr(f"{name}.json", json.dumps(records, ensure_ascii=False),
+                             compress_type=zipfile.ZIP_DEFLATED, compresslevel=compression_level)
+
+            chunks.append({"name": name, "rows": len(ids)})
+            rows += len(ids)
+            print(f"      Status: {rows} filas exportadas de '{collection.name}'.")
+
+    report("Exportación", collection.name, rows, time.perf_counter() - start)
+    return {"name": collection.name, "metadata": collection.metadata, "rows": rows, "dim": dim, "chunks": chunks}
+
+def export_snapshot(client, path, collection_names, page_size, compression_level):
+    entries = []
+    # Se escribe a un temporal: si el proceso se cae, el snapshot anterior sigue intacto
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w") as archive:
+        for name in collection_names:
+            try:
+                collection = client.get_collection(name)
+            except Exception:
+                print(f"   ⚠️ La colección '{name}' no existe. Saltando...")
+                continue
+            print(f"📦 Exportando '{name}' ({collection.count()} documentos)...")
+            entries.append(export_collection(collection, archive, page_size, compression_level))
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "collections": entries
+        }
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
+    os.replace(tmp_path, path)
+    return manifest
+
+# --- IMPORTACION ---
+
+def upsert_batch(collection, ids, documents, metadatas, embeddings):
+    collection.upsert(
+        ids=ids,
+        # La coleccion de centroides no tiene documentos y Chroma no acepta listas de None
+        documents=documents if documents and any(doc is not None for doc in documents) else None,
+        metadatas=metadatas if metadatas and any(meta is not None for meta in metadatas) else None,
+        embeddings=embeddings.tolist()
+    )
+    return len(ids)
+
+def import_collection(client, archive, entry, replace, workers, batch_size):
+    """
+    Sube los bloques del snapshot con varios upserts en paralelo. Se leen del zip
+    en el hilo principal y se mantienen como maximo 2 * workers lotes en vuelo,
+    asi la memoria se mantiene plana.
+    """
+    name = entry["name"]
+    if replace:
+        try:
+            client.delete_collection(name)
+            print(f"🗑️ Colección '{name}' anterior eliminada.")
+        except Exception:
+            pass
+    collection = client.get_or_create_collection(name=name, metadata=entry.get("metadata") or None)
+
+    rows = 0
+    start = time.perf_counter()
+    in_flight = set()
+
+    def collect(futures):
+        nonlocal rows
+        for future in futures:
+            rows += future.result()  # Propaga el primer error del servidor
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot-upsert") as pool:
+        try:
+            for chunk in entry["chunks"]:
+                embeddings = np.load(io.BytesIO(archive.read(f"{chunk['name']}.npy")))
+                records = json.loads(archive.read(f"{chunk['name']}.json"))
+                ids = records["ids"]
+                documents = records.get("documents") or [None] * len(ids)
+                metadatas = records.get("metadatas") or [None] * len(ids)
+                for offset in range(0, len(ids), batch_size):
+                    if len(in_flight) >= 2 * workers:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    end = offset + batch_size
+                    in_flight.add(pool.submit(upsert_batch, collection, ids[offset:end], documents[offset:end],
+                                              metadatas[offset:end], embeddings[offset:end]))
+                print(f"      Status: bloque {chunk['name']} enviado ({chunk['rows']} filas).")
+            collect(in_flight)
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    report("Importación", name, rows, time.perf_counter() - start)
+    stored = collection.count()
+    if stored != entry["rows"]:
+        print(f"   ⚠️ '{name}' tiene {stored} documentos y el snapshot {entry['rows']} "
+              f"(sin --replace se conservan los documentos que ya existían).")
+    return rows
+
+def import_snapshot(client, path, replace, workers, batch_size):
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Formato de snapshot no soportado: {manifest.get('format')}")
+        summary = ", ".join(f"{entry['name']} ({entry['rows']})" for entry in manifest["collections"])
+        print(f"📦 Snapshot del {manifest['created_at']}: {summary}")
+        for entry in manifest["collections"]:
+            print(f"⏫ Importando '{entry['name']}'...")
+            import_collection(client, archive, entry, replace, workers, batch_size)
+
+def main():
+    # --- ARGUMENTOS ---
+    parser = argparse.ArgumentParser(description="Snapshot de las colecciones de ChromaDB")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Guardar las colecciones en un snapshot")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--collections", nargs="+", default=[COLLECTION_NAME, CENTROID_COLLECTION])
+    export_parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    export_parser.add_argument("--compression-level", type=int, default=6, help="Nivel de deflate para los textos (0-9)")
+
+    import_parser = subparsers.add_parser("import", help="Cargar un snapshot en Chroma")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--replace", action="store_true", help="Eliminar las colecciones antes de importar")
+    import_parser.add_argument("--workers", type=int, default=UPSERT_WORKERS)
+    import_parser.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print(f"⏳ Conectando a ChromaDB en {args.host}:{args.port}...")
+    try:
+        client = chromadb.HttpClient(host=args.host, port=args.port)
+        client.heartbeat()
+        print("✅ Conexión exitosa con ChromaDB.")
+    except Exception as e:
+        print(f"❌ Error conectando a ChromaDB. ¿Está corriendo el contenedor Docker? Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    if args.command == "export":
+        manifest = export_snapshot(client, args.path, args.collections, args.page_size, args.compression_level)
+        rows = sum(entry["rows"] for entry in manifest["collections"])
+        size_mb = os.path.getsize(args.path) / (1024 * 1024)
+        print(f"\n🏁 Snapshot guardado en {args.path} ({rows} filas, {size_mb:.1f} MB, "
+              f"{time.perf_counter() - start:.1f}s).")
+    else:
+        # Chroma rechaza lotes mas grandes que su max_batch_size
+        batch_size = min(args.batch_size, getattr(client, "max_batch_size", args.batch_size) or args.batch_size)
+        import_snapshot(client, args.path, args.replace, args.workers, batch_size)
+        print(f"\n🏁 Snapshot importado en {time.perf_counter() - start:.1f}s. La base de datos está lista.")
+
+if __name__ == "__main__":
+    main()
@@ -1,237 +1,888 @@
 import os
+import json
+import time
+import calendar
+import asyncio
 import operator
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Annotated, List, TypedDict, Union
 import re # Importamos regex para limpieza fina
+import textwrap
 
+import numpy as np
 import chromadb
 from sentence_transformers import SentenceTransformer
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langgraph.graph import StateGraph, END
 
+from cache import TTLCache
+from vector_index import LocalVectorIndex
+from diversity import dup_cluster_id, mmr_select
+from centroids import compute_source_centroids, load_centroids, normalize
+from token_budget import estimate_tokens, compact_text, fit_to_budget
+from llm_client import LLMClient
+from metrics import stage_timer, current_agent, request_id, AGENT_ERRORS, PROMPT_TOKENS
+
 # --- 1. CONFIGURACIÓN DE INFRAESTRUCTURA ---
+# Nada pesado se hace al importar el modulo: la conexion a Chroma, el modelo de
+# embeddings y el cliente del LLM se crean la primera vez que se necesitan (o en
+# warm_up(), que main.py llama al arrancar). Asi el contenedor arranca rapido y,
+# con gunicorn --preload, el modelo se puede cargar una sola vez antes del fork.
 CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
 CHROMA_PORT = 8000
+# Segundos minimos entre dos intentos de reconexion a Chroma
+CHROMA_RETRY_SECONDS = float(os.getenv("CHROMA_RETRY_SECONDS", "10"))
+
+chroma_client = None
+collection = None
+_last_connect_attempt = 0.0
+_resource_lock = threading.Lock()
+
+def get_collection():
+    """
+    Devuelve la coleccion 'project_archive', conectando de forma perezosa. Si la
+    base de datos aun no esta arriba se reintenta en la siguiente consulta (como
+    maximo una vez cada CHROMA_RETRY_SECONDS) en vez de quedar en None para siempre.
+    """
+    global chroma_client, collection, _last_connect_attempt
+    if collection is not None:
+        return collection
+    with _resource_lock:
+        if collection is None and time.monotonic() - _last_connect_attempt >= CHROMA_RETRY_SECONDS:
+            _last_connect_attempt = time.monotonic()
+            print(f"🔌 Conectando a ChromaDB en {CHROMA_HOST}:{CHROMA_PORT}...")
+            try:
+                client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+                collection = client.get_collection("project_archive")
+                chroma_client = client
+                print("✅ Conexión exitosa a la colección 'project_archive'")
+            except Exception as e:
+                print(f"⚠️ Advertencia: No se pudo conectar a ChromaDB ({e}). Se reintentará más tarde.")
+    return collection
+
+# Pool acotado de hilos para el trabajo bloqueante (embeddings + consultas a Chroma),
+# asi el event loop de uvicorn nunca se congela esperando a la base de datos.
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "8"))
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="retrieval")
 
-print(f"🔌 Conectando a ChromaDB en {CHROMA_HOST}:{CHROMA_PORT}...")
+async def run_in_pool(fn, *args):
+    """
+    Ejecuta `fn` en el pool de hilos conservando el contexto (request_id y agente
+    actual), para que las metricas y los logs del hilo sepan a quien pertenecen.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(blocking_executor, ctx.run, fn, *args)
+
+# Backend del encoder de consultas:
+#   "torch"          -> SentenceTransformer normal (por defecto)
+#   "onnx"           -> ONNX Runtime en CPU (requiere optimum[onnxruntime])
+#   "onnx-quantized" -> ONNX cuantizado a int8, el mas rapido en CPU
+# Los documentos de Chroma se codificaron con el modelo torch; las variantes ONNX
+# producen vectores practicamente identicos, la cuantizada con un error pequeño.
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_QUANTIZED_FILE = os.getenv("ONNX_QUANTIZED_FILE", "onnx/model_qint8_avx2.onnx")
 
-try:
-    chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-    collection = chroma_client.get_collection("project_archive")
-    print("✅ Conexión exitosa a la colección 'project_archive'")
-except Exception as e:
-    print(f"⚠️ Advertencia: No se pudo conectar a ChromaDB ({e}). Se usará modo mock si falla.")
-    collection = None
+embedding_model = None
 
-print("🧠 Cargando modelo de embeddings para consultas...")
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+def get_embedding_model():
+    global embedding_model
+    if embedding_model is not None:
+        return embedding_model
+    with _resource_lock:
+        if embedding_model is None:
+            print(f"🧠 Cargando modelo de embeddings para consultas (backend: {EMBEDDING_BACKEND})...")
+            if EMBEDDING_BACKEND == "onnx":
+                model = SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx")
+            elif EMBEDDING_BACKEND == "onnx-quantized":
+                model = SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx",
+                                            model_kwargs={"file_name": ONNX_QUANTIZED_FILE})
+            else:
+                model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+            embedding_model = model
+    return embedding_model
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-lite",
-    temperature=0.7,
-    google_api_key=os.getenv("GOOGLE_API_KEY")
+# Cache de embeddings de consultas (clave: texto normalizado). Las preguntas
+# repetidas o populares no vuelven a pasar por el modelo.
+query_embedding_cache = TTLCache(
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
 )
 
+llm = None
+fallback_llm = None
+
+# Resiliencia del LLM (ver llm_client.py). LLM_FALLBACK_MODEL vacio = sin respaldo.
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash-lite")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+# LLM_TIMEOUT acota cada intento y LLM_DEADLINE la llamada completa (reintentos,
+# hedging y respaldo incluidos). Una peticion hace hasta tres rondas de llamadas
+# (agentes, resumenes por grupo y sintesis) y ademas la acota ASK_DEADLINE en
+# main.py, por debajo del LOGIC_READ_TIMEOUT (60s) de la capa de presentacion.
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))  # 0 = sin limite
+# Limite global de llamadas simultaneas al LLM en este proceso. Lo comparten
+# /ask, /ask/stream y /ask/batch, asi un lote grande no agota la cuota de la API
+# ni deja sin turno a las preguntas interactivas.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+def build_gemini(model_name):
+    return ChatGoogleGenerativeAI(
+        model=model_name,
+        temperature=0.7,
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        # Los reintentos y el deadline los maneja llm_client, no el SDK
+        max_retries=0
+    )
+
+def get_llm():
+    global llm
+    if llm is None:
+        llm = build_gemini(LLM_MODEL)
+    return llm
+
+def get_fallback_llm():
+    global fallback_llm
+    if fallback_llm is None:
+        fallback_llm = build_gemini(LLM_FALLBACK_MODEL)
+    return fallback_llm
+
+llm_client = LLMClient(
+    primary=get_llm,
+    fallback=get_fallback_llm if LLM_FALLBACK_MODEL else None,
+    timeout=LLM_TIMEOUT,
+    deadline=LLM_DEADLINE,
+    max_retries=LLM_MAX_RETRIES,
+    hedge=LLM_HEDGE,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    burst=int(os.getenv("LLM_BURST", "10"))
+)
+
+async def call_llm(prompt_value):
+    """Punto unico de llamada al LLM para todos los nodos."""
+    return await llm_client.ainvoke(prompt_value)
+
 # --- 2. PERSONALIDADES ---
-AGENTS_CONFIG = {
-    "Survivor": {
-        "role": "Oficial de Bioseguridad y Supervivencia.",
-        "source_filter": "survivor_context",
-        "keywords": "covid pandemic virus death emergency quarantine fear symptoms hospital",
-        "style": """
-        Eres paranoico, metódico y obsesionado con la prevención.
-        Tu lenguaje es técnico-militar y médico.
-        Frases clave: 'Protocolo de contención', 'Carga viral', 'Zona cero'.
-        Ves peligros en todos lados. Tu tono es de alerta urgente.
-        """
-    },
-    "Speculator": {
-        "role": "Analista de Mercados Cuantitativo.",
-        "source_filter": "speculator_context",
-        "keywords": "stock market finance money spx nasdaq crash volatility profit liquidity",
-        "style": """
-        Eres un analista frío, matemático y pragmático. No eres malvado, simplemente indiferente a lo humano.
-        Solo te importan los números, el ROI y la volatilidad.
-        Donde otros ven tragedia, tú ves patrones gráficos y correcciones de mercado.
-        Usas jerga financiera técnica: 'Bull trap', 'Liquidez', 'Soporte', 'Volatilidad'.
-        Tu tono es seco, directo y desapegado.
-        """
-    },
-    "Auteur": {
-        "role": "Director de Videojuegos Visionario (Estilo Hideo Kojima).",
-        "source_filter": "auteur_context",
-        "keywords": "connection strands isolation technology soul humanity art cinema",
-        "style": """
-        Eres un creador enigmático que habla mediante aforismos cortos y profundos.
-        Hablas con sentencias potentes como en un tráiler de cine.
-        Hablas de 'conexiones' (strands) y la soledad digital.
-        Tu tono es melancólico pero muy conciso.
-        """
-    }
-}
+# Los personajes se definen en personas.json (o en PERSONAS_FILE), en el orden en
+# que aparecen en los logs. Cada uno declara su rol, estilo, palabras clave, la
+# particion de Chroma que consulta (source_filter), cuantos documentos recupera
+# (k) y la perspectiva que el Synthesizer contrasta. Sumar un personaje respaldado
+# por un dataset nuevo es agregar una entrada: el grafo se arma a partir de aqui.
+PERSONAS_FILE = os.getenv("PERSONAS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas.json"))
+REQUIRED_PERSONA_FIELDS = ("name", "role", "style", "keywords", "source_filter")
+# Nombres que ya usan otros nodos del grafo
+RESERVED_NODE_NAMES = {"Embedder", "Synthesizer"}
 
-# --- 3. ESTADO ---
-class AgentState(TypedDict):
-    question: str
-    analysis_logs: Annotated[List[dict], operator.add] 
-    final_synthesis: str
+def load_personas(path=PERSONAS_FILE):
+    """Lee el registro de personajes y devuelve {nombre: config} en el orden del archivo."""
+    with open(path, encoding="utf-8") as f:
+        personas = json.load(f)
 
-# --- 4. FUNCIONES CORE ---
+    config = {}
+    for persona in personas:
+        missing = [field for field in REQUIRED_PERSONA_FIELDS if not persona.get(field)]
+        if missing:
+            raise ValueError(f"Personaje inválido en {path}: faltan {missing}")
+        name = persona["name"]
+        if name in config or name in RESERVED_NODE_NAMES:
+            raise ValueError(f"Nombre de personaje repetido o reservado en {path}: {name}")
+        config[name] = {"k": 3, **{key: value for key, value in persona.items() if key != "name"}}
+    if not config:
+        raise ValueError(f"{path} no define ningún personaje")
+    return config
 
-def query_chroma(query_text, source_tag, desired_results=3):
-    if not collection:
-        return ["(Error de conexión a BD - Sin contexto disponible)"]
-    
-    try:
-        RAW_FETCH_LIMIT = 15 
-        query_emb = embedding_model.encode([query_text]).tolist()
-        results = collection.query(
-            query_embeddings=query_emb,
-            n_results=RAW_FETCH_LIMIT, 
-            where={"source": source_tag}
-        )
-        raw_docs = results['documents'][0] if results['documents'] else []
-        
-        unique_docs = []
-        seen_content = set()
-        
-        for doc in raw_docs:
-            clean_doc = doc.strip()
-            if clean_doc not in seen_content:
-                unique_docs.append(clean_doc)
-                seen_content.add(clean_doc)
-            if len(unique_docs) >= desired_results:
-                break
-        return unique_docs
+AGENTS_CONFIG = load_personas()
+
+# Modo de ejecucion del grafo: "parallel" lanza los agentes a la vez desde el
+# Embedder y los une en el Synthesizer (latencia ~ max(agente) + sintesis).
+# "sequential" los encadena en el orden del registro.
+GRAPH_MODE = os.getenv("GRAPH_MODE", "parallel")
+
+# Orden canonico de los agentes, usado para que los logs salgan siempre igual
+# sin importar que agente termine primero.
+AGENT_ORDER = list(AGENTS_CONFIG.keys())
+
+# --- BACKEND DE RECUPERACION ---
+# "chroma": cada consulta es un round-trip HTTP al servidor con filtro `where`.
+# "local": las particiones se cargan en memoria (snapshot mapeado en disco) y el
+# top-k se calcula en proceso. Chroma sigue siendo la fuente de verdad.
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")
+INDEX_SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "index_snapshot")
+
+local_index = None
 
+def init_local_index():
+    """Construye el indice en proceso si RETRIEVAL_BACKEND=local y Chroma esta disponible."""
+    global local_index
+    if RETRIEVAL_BACKEND != "local" or local_index is not None or get_collection() is None:
+        return local_index
+    print("🗂️  Construyendo índice vectorial en proceso...")
+    try:
+        index = LocalVectorIndex(get_collection(), INDEX_SNAPSHOT_DIR)
+        index.load({cfg["source_filter"] for cfg in AGENTS_CONFIG.values()})
+        local_index = index
     except Exception as e:
-        return [f"(Error consultando Chroma: {str(e)})"]
+        print(f"⚠️ No se pudo construir el índice local ({e}). Se usará Chroma directamente.")
+    return local_index
 
-def run_agent_process(agent_name, state: AgentState):
-    question = state["question"]
-    config = AGENTS_CONFIG[agent_name]
-    
-    search_query = f"{question} {config.get('keywords', '')}"
-    print(f"   🔍 {agent_name} buscando: '{search_query[:50]}...'")
-    
-    context_docs = query_chroma(search_query, config["source_filter"], desired_results=3)
-    context_str = "\n".join([f"> {doc}" for doc in context_docs])
-    
-    template = """
+# --- PROMPTS ---
+# Las plantillas se compilan una sola vez al importar el modulo, sin la sangria
+# del codigo (que tambien se cobra en tokens), y el estilo de cada personaje se
+# compacta a una sola linea.
+AGENT_PROMPT = PromptTemplate.from_template(textwrap.dedent("""
     SYSTEM IDENTITY:
     Nombre: {agent_name}
     Rol: {role}
     Estilo: {style}
-    
+
     DATOS RECUPERADOS:
     {context}
-    
+
     PREGUNTA: "{query}"
-    
+
     INSTRUCCIONES:
     1. Responde desde tu personaje.
     2. Usa los datos recuperados.
-    
+
     RESTRICCIONES DE FORMATO (CRÍTICO):
     - NO uses títulos, NO escribas "Pensamiento Interno:", NO uses paréntesis introductorios.
     - Empieza a escribir tu idea directamente.
     - LONGITUD MÁXIMA: 80 PALABRAS o 5 ORACIONES.
     - SÉ CONCISO.
-    
+
     OUTPUT:
     Únicamente el contenido del pensamiento.
+    """).strip())
+
+SYNTHESIS_PROMPT = PromptTemplate.from_template(textwrap.dedent("""
+    Eres 'The Historian'. Sintetiza los pensamientos de {agent_count} agentes ante: "{query}"
+
+    INPUT:
+    {logs}
+
+    INSTRUCCIONES:
+    Genera una 'Síntesis Narrativa' breve (máx 120 palabras).
+    Contrasta {perspectives}.
+    Concluye con una reflexión sobre la disonancia cognitiva social que sirva para un estudio academico.
+    """).strip())
+
+# Paso intermedio de la sintesis jerarquica (ver reduce_logs): resume un grupo de
+# pensamientos conservando las posturas de cada agente para el Synthesizer.
+GROUP_SUMMARY_PROMPT = PromptTemplate.from_template(textwrap.dedent("""
+    Eres 'The Historian'. Resume los pensamientos de estos agentes ante: "{query}"
+
+    INPUT:
+    {logs}
+
+    INSTRUCCIONES:
+    Máximo 80 palabras. Conserva la postura de cada agente ({perspectives}) y nombra a quién pertenece cada idea.
+    No concluyas: este resumen es un insumo para la síntesis final.
+    """).strip())
+
+COMPACT_STYLES = {name: compact_text(cfg["style"]) for name, cfg in AGENTS_CONFIG.items()}
+
+# Si el LLM desobedece y pone "Pensamiento Interno:", lo borramos (ver run_agent_process)
+CLEANUP_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r"^Pensamiento Interno:\s*",
+        r"^\(Pensamiento Interno\)\s*",
+        r"^Pensamiento:\s*",
+        r"^Opini[oó]n:\s*"
+    )
+]
+
+# Tokens maximos (estimados) para el contexto recuperado de cada agente y para
+# los pensamientos que recibe el Synthesizer. 0 desactiva el recorte.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "200"))
+SYNTHESIS_TOKEN_BUDGET = int(os.getenv("SYNTHESIS_TOKEN_BUDGET", "600"))
+# Con mas pensamientos que esto el Synthesizer los resume por grupos (en
+# paralelo) antes de la sintesis final, para que el prompt no crezca con cada
+# personaje nuevo.
+SYNTHESIS_GROUP_SIZE = max(int(os.getenv("SYNTHESIS_GROUP_SIZE", "4")), 2)
+
+# --- 3. ESTADO ---
+def merge_logs(current: List[dict], new: List[dict]) -> List[dict]:
+    """Concatena los logs y los ordena segun AGENT_ORDER (orden determinista)."""
+    merged = operator.add(current or [], new or [])
+    return sorted(
+        merged,
+        key=lambda log: AGENT_ORDER.index(log["agent"]) if log.get("agent") in AGENT_ORDER else len(AGENT_ORDER)
+    )
+
+class AgentState(TypedDict):
+    question: str
+    personas: List[str]  # agentes elegidos para esta peticion (vacio = todos)
+    query_embeddings: dict  # agente -> embedding de su consulta (lo llena el nodo Embedder)
+    prefetched_context: dict  # agente -> documentos ya recuperados (solo en /ask/batch)
+    analysis_logs: Annotated[List[dict], merge_logs]
+    final_synthesis: str
+
+# --- 4. FUNCIONES CORE ---
+
+def report_prompt_tokens(prompt_value, response):
+    """
+    Registra los tokens de entrada de una llamada al LLM: los que reporta el
+    modelo en usage_metadata o, si no los da, la estimacion por caracteres.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    tokens = usage.get("input_tokens") or estimate_tokens(prompt_value.to_string())
+    PROMPT_TOKENS.labels(agent=current_agent.get()).observe(tokens)
+    return tokens
+
+def normalize_query(text):
+    """Normaliza el texto para usarlo como clave de cache (minusculas, espacios simples)."""
+    return " ".join(text.lower().split())
+
+def selected_personas(state):
+    """Agentes que participan en esta ejecucion, en el orden canonico."""
+    chosen = state.get("personas")
+    if not chosen:
+        return AGENT_ORDER
+    return [name for name in AGENT_ORDER if name in chosen]
+
+def build_search_query(question, agent_name):
+    return f"{question} {AGENTS_CONFIG[agent_name].get('keywords', '')}"
+
+# --- FILTRO TEMPORAL ---
+# El archivo cubre abril-junio de 2020. Si la pregunta menciona meses ("en abril",
+# "between April and June") la busqueda se limita a ese periodo con un filtro
+# `where` sobre el campo numerico `epoch` que escribe el ETL.
+TIME_FILTER = os.getenv("TIME_FILTER", "1") == "1"
+# Año que se asume cuando la pregunta nombra un mes sin año
+ARCHIVE_YEAR = int(os.getenv("ARCHIVE_YEAR", "2020"))
+
+MONTHS = {
+    "enero": 1, "january": 1, "febrero": 2, "february": 2, "marzo": 3, "march": 3,
+    "abril": 4, "april": 4, "mayo": 5, "may": 5, "junio": 6, "june": 6,
+    "julio": 7, "july": 7, "agosto": 8, "august": 8, "septiembre": 9, "setiembre": 9,
+    "september": 9, "octubre": 10, "october": 10, "noviembre": 11, "november": 11,
+    "diciembre": 12, "december": 12
+}
+# "may" y "march" tambien son palabras comunes en ingles ("May I ask...", "to
+# march"): solo cuentan como mes seguidas de un año o despues de una preposicion
+# de tiempo ("in May", "between April and May"). "to" ademas exige mayuscula.
+AMBIGUOUS_MONTHS = {"may", "march"}
+MONTH_PREPOSITIONS = {
+    "in", "during", "since", "until", "till", "from", "to", "through", "by", "of", "before",
+    "after", "early", "mid", "late", "between", "and", "or", "en", "de", "desde", "hasta"
+}
+PREVIOUS_WORD_RE = re.compile(r"(\w+)[\s-]*$")
+MONTH_RE = re.compile(
+    r"\b(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b(?:\s+(?:de\s+|del\s+|of\s+)?(20\d{2})\b)?",
+    re.IGNORECASE
+)
+
+def is_month_context(question, start, word):
+    """True si la palabra ambigua en `start` va despues de una preposicion de tiempo."""
+    previous = PREVIOUS_WORD_RE.search(question[:start])
+    if previous is None:
+        return False
+    preposition = previous.group(1).lower()
+    if preposition == "to":
+        return word[0].isupper()
+    return preposition in MONTH_PREPOSITIONS
+
+def detect_time_range(question):
     """
+    Devuelve (inicio, fin) en epoch UTC cubriendo desde el primer hasta el ultimo
+    mes mencionado en la pregunta, o None si no menciona ninguno.
+    """
+    if not TIME_FILTER:
+        return None
+    months = []
+    for match in MONTH_RE.finditer(question):
+        word, year = match.group(1), match.group(2)
+        if word.lower() in AMBIGUOUS_MONTHS and not year and not is_month_context(question, match.start(), word):
+            continue
+        months.append((int(year) if year else None, MONTHS[word.lower()]))
+    if not months:
+        return None
+
+    # Un año solo acompaña al mes que lo precede ("December 2019"). Un mes sin
+    # año toma el del siguiente mes que si lo lleva ("March and April 2019") o,
+    # si no hay ninguno despues, el del archivo: "December 2019 and March" es
+    # dic 2019 - mar 2020 y el 2008 de "after the 2008 crisis in April" no cuenta.
+    mentioned = []
+    next_year = ARCHIVE_YEAR
+    for year, month in reversed(months):
+        if year is not None:
+            next_year = year
+        mentioned.append((next_year, month))
+
+    first, last = min(mentioned), max(mentioned)
+    end_year, end_month = (last[0] + 1, 1) if last[1] == 12 else (last[0], last[1] + 1)
+    return (calendar.timegm((first[0], first[1], 1, 0, 0, 0)),
+            calendar.timegm((end_year, end_month, 1, 0, 0, 0)))
+
+def build_where(source_tag, time_range=None):
+    if time_range is None:
+        return {"source": source_tag}
+    return {"$and": [
+        {"source": source_tag},
+        {"epoch": {"$gte": time_range[0]}},
+        {"epoch": {"$lt": time_range[1]}}
+    ]}
+
+def encode_queries(texts):
+    """
+    Devuelve los embeddings de varias consultas. Las que no estan en cache se
+    codifican juntas en una sola pasada (batch) del modelo.
+    """
+    keys = [normalize_query(t) for t in texts]
+    embeddings = [query_embedding_cache.get(k) for k in keys]
+
+    missing = [i for i, emb in enumerate(embeddings) if emb is None]
+    if missing:
+        # Evitamos codificar dos veces el mismo texto dentro del mismo batch
+        unique_keys = list(dict.fromkeys(keys[i] for i in missing))
+        with stage_timer("embedding_encode"):
+            encoded = get_embedding_model().encode(unique_keys).tolist()
+        for key, emb in zip(unique_keys, encoded):
+            query_embedding_cache.set(key, emb)
+        fresh = dict(zip(unique_keys, encoded))
+        for i in missing:
+            embeddings[i] = fresh[keys[i]]
+    return embeddings
+
+# --- VECTORES DE CONSULTA POR PERSONAJE ---
+# "keywords": se codifica "pregunta + palabras clave" una vez por personaje
+#             (N pasadas del modelo por pregunta, ninguna reutilizable).
+# "centroid": se codifica solo la pregunta y se suma, con peso
+#             PERSONA_VECTOR_WEIGHT, un vector fijo por personaje (sus palabras
+#             clave + el centroide de su particion que calcula el ETL). Una sola
+#             pasada por pregunta, y es el mismo embedding que usa el cache de
+#             respuestas. benchmarks/eval_retrieval.py compara el recall de ambos.
+RETRIEVAL_QUERY_MODE = os.getenv("RETRIEVAL_QUERY_MODE", "keywords")
+PERSONA_VECTOR_WEIGHT = float(os.getenv("PERSONA_VECTOR_WEIGHT", "0.5"))
+
+persona_vectors = {}
+_persona_vectors_lock = threading.Lock()
+
+def get_persona_vectors():
+    """
+    {agente: vector} para el modo "centroid". Se calculan una vez; si Chroma
+    aun no esta disponible se usan solo las palabras clave y no se guardan,
+    para incorporar los centroides cuando vuelva.
+    """
+    if persona_vectors:
+        return persona_vectors
+    with _persona_vectors_lock:
+        if persona_vectors:
+            return persona_vectors
+        keyword_embeddings = dict(zip(AGENT_ORDER, encode_queries([cfg["keywords"] for cfg in AGENTS_CONFIG.values()])))
+        if get_collection() is None:
+            return {name: normalize(emb) for name, emb in keyword_embeddings.items()}
+
+        tags = list(dict.fromkeys(cfg["source_filter"] for cfg in AGENTS_CONFIG.values()))
+        centroids = load_centroids(chroma_client, tags) if chroma_client is not None else {}
+        missing = [tag for tag in tags if tag not in centroids]
+        if missing:
+            print(f"⚠️ Sin centroides del ETL para {missing}; se calculan recorriendo la colección.")
+            centroids.update({tag: centroid for tag, (centroid, _) in compute_source_centroids(get_collection(), missing).items()})
+
+        vectors = {}
+        for name, keyword_embedding in keyword_embeddings.items():
+            centroid = centroids.get(AGENTS_CONFIG[name]["source_filter"])
+            vectors[name] = normalize(keyword_embedding) if centroid is None else normalize(normalize(keyword_embedding) + centroid)
+        persona_vectors.update(vectors)
+        return persona_vectors
+
+def combine_query(question_embedding, persona_vector):
+    """Pregunta + peso * vector del personaje, renormalizado (Chroma compara por distancia L2)."""
+    return normalize(normalize(question_embedding) + PERSONA_VECTOR_WEIGHT * persona_vector).tolist()
+
+def persona_query_embeddings(questions, names):
+    """Devuelve, por pregunta, {agente: embedding de consulta} segun RETRIEVAL_QUERY_MODE."""
+    if RETRIEVAL_QUERY_MODE == "centroid":
+        vectors = get_persona_vectors()
+        return [
+            {name: combine_query(question_embedding, vectors[name]) for name in names}
+            for question_embedding in encode_queries(questions)
+        ]
+    embeddings = encode_queries([build_search_query(q, name) for q in questions for name in names])
+    per_question = len(names)
+    return [dict(zip(names, embeddings[i * per_question:(i + 1) * per_question])) for i in range(len(questions))]
+
+# --- RECUPERACION ---
+# Se piden desired_results * RETRIEVAL_OVERFETCH candidatos y se colapsan los
+# casi-duplicados (retweets, el mismo texto con otra URL o mencion). Solo si
+# quedan menos documentos distintos de los necesarios, y el backend aun tiene
+# mas, se repite la consulta duplicando el tamaño hasta RETRIEVAL_MAX_FETCH.
+RETRIEVAL_OVERFETCH = int(os.getenv("RETRIEVAL_OVERFETCH", "3"))
+RETRIEVAL_MAX_FETCH = int(os.getenv("RETRIEVAL_MAX_FETCH", "60"))
+# MMR opcional: reordena los candidatos distintos para que el contexto no sean
+# tres variaciones de la misma idea. MMR_LAMBDA=1 equivale a solo relevancia.
+RETRIEVAL_MMR = os.getenv("RETRIEVAL_MMR", "0") == "1"
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MMR_POOL_SIZE = int(os.getenv("MMR_POOL_SIZE", "20"))
+# Maximo de embeddings por llamada a Chroma en las consultas por lotes
+BATCH_QUERY_SIZE = int(os.getenv("BATCH_QUERY_SIZE", "64"))
+
+def fetch_candidates_batch(query_embeddings, source_tag, n_results, include_embeddings=False, time_range=None):
+    """
+    Obtiene los candidatos de varias consultas de la misma particion. Contra
+    Chroma se envian todos los embeddings en una sola llamada (en bloques de
+    BATCH_QUERY_SIZE) en vez de un round-trip por consulta.
+    Devuelve, por consulta, (documentos, metadatos, embeddings o None).
+    """
+    with stage_timer("chroma_query"):
+        if local_index is not None and source_tag in local_index.partitions:
+            return [local_index.query(emb, source_tag, n_results, include_embeddings, time_range)
+                    for emb in query_embeddings]
+
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        candidates = []
+        for start in range(0, len(query_embeddings), BATCH_QUERY_SIZE):
+            block = query_embeddings[start:start + BATCH_QUERY_SIZE]
+            results = get_collection().query(
+                query_embeddings=block,
+                n_results=n_results,
+                where=build_where(source_tag, time_range),
+                include=include
+            )
+            for i in range(len(block)):
+                documents = results['documents'][i] if results['documents'] else []
+                metadatas = results['metadatas'][i] if results.get('metadatas') else []
+                embeddings = results['embeddings'][i] if include_embeddings and results.get('embeddings') is not None else None
+                candidates.append((documents, metadatas, embeddings))
+        return candidates
+
+def fetch_candidates(query_embedding, source_tag, n_results, include_embeddings=False, time_range=None):
+    """Obtiene los documentos candidatos del backend configurado (indice local o Chroma)."""
+    return fetch_candidates_batch([query_embedding], source_tag, n_results, include_embeddings, time_range)[0]
+
+def collapse_duplicates(documents, metadatas):
+    """
+    Indices del primer documento (el mas cercano) de cada cluster de casi-duplicados.
+    El cluster viene precalculado por el ETL en los metadatos (O(k)); para
+    documentos cargados antes de ese campo se calcula aqui.
+    """
+    kept = []
+    seen_clusters = set()
+    for i, doc in enumerate(documents):
+        metadata = (metadatas[i] if i < len(metadatas) else None) or {}
+        cluster = metadata.get("dup_cluster") or dup_cluster_id(doc)
+        if cluster not in seen_clusters:
+            seen_clusters.add(cluster)
+            kept.append(i)
+    return kept
+
+def select_context(query_embedding, candidates, desired_results):
+    """Devuelve (documentos elegidos, cantidad de documentos distintos entre los candidatos)."""
+    documents, metadatas, embeddings = candidates
+    with stage_timer("dedup"):
+        kept = collapse_duplicates(documents, metadatas)
+
+    if RETRIEVAL_MMR and embeddings is not None and len(kept) > desired_results:
+        with stage_timer("mmr"):
+            order = mmr_select(query_embedding, np.asarray(embeddings)[kept], desired_results, MMR_LAMBDA)
+            kept = [kept[i] for i in order]
+
+    return [documents[i].strip() for i in kept[:desired_results]], len(kept)
+
+def retrieve(query_embeddings, source_tag, desired_results, time_range=None):
+    """
+    Recuperacion con over-fetch adaptativo para un lote de consultas de la misma
+    particion. Con time_range se filtra por periodo; las consultas que no reunen
+    desired_results documentos dentro del periodo se repiten sin el filtro.
+    """
+    n_results = desired_results * RETRIEVAL_OVERFETCH
+    if RETRIEVAL_MMR:
+        n_results = max(n_results, MMR_POOL_SIZE)
+    n_results = min(n_results, RETRIEVAL_MAX_FETCH)
+
+    selected = [[] for _ in query_embeddings]
+    pending = list(range(len(query_embeddings)))
+    while pending:
+        candidates = fetch_candidates_batch([query_embeddings[i] for i in pending], source_tag, n_results,
+                                            include_embeddings=RETRIEVAL_MMR, time_range=time_range)
+        expand = []
+        for i, query_candidates in zip(pending, candidates):
+            selected[i], distinct = select_context(query_embeddings[i], query_candidates, desired_results)
+            # Si el backend devolvio todo lo pedido es que puede haber mas documentos distintos
+            if distinct < desired_results and len(query_candidates[0]) >= n_results and n_results < RETRIEVAL_MAX_FETCH:
+                expand.append(i)
+        pending = expand
+        n_results = min(n_results * 2, RETRIEVAL_MAX_FETCH)
+
+    if time_range is not None:
+        short = [i for i, docs in enumerate(selected) if len(docs) < desired_results]
+        if short:
+            unfiltered = retrieve([query_embeddings[i] for i in short], source_tag, desired_results)
+            for i, docs in zip(short, unfiltered):
+                selected[i] = docs
+    return selected
+
+def query_chroma(query_text, source_tag, desired_results=3, query_embedding=None, time_range=None):
+    if local_index is None and get_collection() is None:
+        return ["(Error de conexión a BD - Sin contexto disponible)"]
     
-    prompt = PromptTemplate.from_template(template)
-    chain = prompt | llm
+    try:
+        if query_embedding is None:
+            query_embedding = encode_queries([query_text])[0]
+        return retrieve([query_embedding], source_tag, desired_results, time_range)[0]
+
+    except Exception as e:
+        return [f"(Error consultando Chroma: {str(e)})"]
+
+def query_chroma_batch(query_embeddings, source_tag, desired_results=3, time_range=None):
+    """Como query_chroma pero para muchas consultas a la vez; devuelve una lista por consulta."""
+    if local_index is None and get_collection() is None:
+        return [["(Error de conexión a BD - Sin contexto disponible)"] for _ in query_embeddings]
+
+    try:
+        return retrieve(query_embeddings, source_tag, desired_results, time_range)
+
+    except Exception as e:
+        return [[f"(Error consultando Chroma: {str(e)})"] for _ in query_embeddings]
+
+def prepare_batch(questions, personas=None):
+    """
+    Hace la recuperacion de un lote de preguntas por adelantado: todas las
+    consultas del lote se codifican en una sola pasada del modelo y
+    cada agente consulta su particion una vez con los embeddings de todo el lote
+    (pidiendo los `k` documentos de su configuracion).
+    Devuelve, por pregunta, los campos del estado inicial del grafo
+    (query_embeddings y prefetched_context) para que los nodos no repitan el trabajo.
+    """
+    names = selected_personas({"personas": personas})
+    prepared = [
+        {"query_embeddings": embeddings, "prefetched_context": {}}
+        for embeddings in persona_query_embeddings(questions, names)
+    ]
+    # Las preguntas con el mismo periodo comparten filtro `where`: una consulta
+    # por agente y periodo distinto del lote
+    groups = {}
+    for i, question in enumerate(questions):
+        groups.setdefault(detect_time_range(question), []).append(i)
+
+    for agent_name in names:
+        config = AGENTS_CONFIG[agent_name]
+        for time_range, members in groups.items():
+            agent_embeddings = [prepared[i]["query_embeddings"][agent_name] for i in members]
+            contexts = query_chroma_batch(agent_embeddings, config["source_filter"], config["k"], time_range)
+            for i, docs in zip(members, contexts):
+                prepared[i]["prefetched_context"][agent_name] = docs
+    return prepared
+
+async def aquery_chroma(query_text, source_tag, desired_results=3, query_embedding=None, time_range=None):
+    """Version asincrona de query_chroma: delega el trabajo al pool de hilos."""
+    return await run_in_pool(query_chroma, query_text, source_tag, desired_results, query_embedding, time_range)
+
+async def run_agent_process(agent_name, state: AgentState):
+    question = state["question"]
+    config = AGENTS_CONFIG[agent_name]
+    current_agent.set(agent_name)
     
+    search_query = build_search_query(question, agent_name)
+    print(f"   🔍 [{request_id.get()}] {agent_name} buscando: '{search_query[:50]}...'")
+    
+    context_docs = (state.get("prefetched_context") or {}).get(agent_name)
+    if context_docs is None:
+        query_embedding = (state.get("query_embeddings") or {}).get(agent_name)
+        context_docs = await aquery_chroma(search_query, config["source_filter"], desired_results=config["k"],
+                                           query_embedding=query_embedding,
+                                           time_range=detect_time_range(question))
+    prompt_tokens = None
     try:
-        response = chain.invoke({
-            "agent_name": agent_name,
-            "role": config["role"],
-            "style": config["style"],
-            "context": context_str,
-            "query": question
-        })
+        with stage_timer("prompt_render"):
+            context_str = "\n".join([f"> {doc}" for doc in fit_to_budget(context_docs, CONTEXT_TOKEN_BUDGET)])
+            prompt_value = AGENT_PROMPT.format_prompt(
+                agent_name=agent_name,
+                role=config["role"],
+                style=COMPACT_STYLES[agent_name],
+                context=context_str,
+                query=question
+            )
+        response = await call_llm(prompt_value)
+        prompt_tokens = report_prompt_tokens(prompt_value, response)
         thought = response.content
         
         # --- LIMPIEZA DE SEGURIDAD ---
         # Si el LLM desobedece y pone "Pensamiento Interno:", lo borramos aquí.
         # Esto asegura que el frontend no tenga títulos duplicados.
-        patterns_to_remove = [
-            r"^Pensamiento Interno:\s*", 
-            r"^\(Pensamiento Interno\)\s*",
-            r"^Pensamiento:\s*",
-            r"^Opini[oó]n:\s*"
-        ]
-        for pattern in patterns_to_remove:
-            thought = re.sub(pattern, "", thought, flags=re.IGNORECASE).strip()
+        with stage_timer("regex_cleanup"):
+            for pattern in CLEANUP_PATTERNS:
+                thought = pattern.sub("", thought).strip()
 
     except Exception as e:
+        AGENT_ERRORS.labels(agent=agent_name).inc()
+        print(f"   ❌ [{request_id.get()}] {agent_name} falló: {e}")
         thought = f"[ERROR DE PROCESAMIENTO]: {str(e)}"
         
     return {
         "analysis_logs": [{
             "agent": agent_name,
             "thought": thought,
-            "context_used": context_docs
+            "context_used": context_docs,
+            "prompt_tokens": prompt_tokens
         }]
     }
 
 # --- 5. NODOS DEL GRAFO ---
 
-def node_survivor(state: AgentState):
-    return run_agent_process("Survivor", state)
+async def node_embedder(state: AgentState):
+    """Codifica las consultas de los agentes elegidos en un solo batch antes del fan-out."""
+    if state.get("query_embeddings"):
+        # Ya vienen calculadas (por ejemplo desde prepare_batch en /ask/batch)
+        return {}
+    embeddings = await run_in_pool(persona_query_embeddings, [state["question"]], selected_personas(state))
+    return {"query_embeddings": embeddings[0]}
 
-def node_speculator(state: AgentState):
-    return run_agent_process("Speculator", state)
+def make_agent_node(agent_name):
+    async def node_agent(state: AgentState):
+        return await run_agent_process(agent_name, state)
+    return node_agent
 
-def node_auteur(state: AgentState):
-    return run_agent_process("Auteur", state)
+def describe_perspectives(names):
+    """'el miedo (Survivor), la frialdad financiera (Speculator) y la melancolía (Auteur)'"""
+    parts = []
+    for name in names:
+        if name in AGENTS_CONFIG:
+            perspective = AGENTS_CONFIG[name].get("perspective") or f"la visión de {name}"
+            parts.append(f"{perspective} ({name})")
+        else:
+            parts.append(name)
+    if len(parts) < 2:
+        return "".join(parts)
+    return ", ".join(parts[:-1]) + " y " + parts[-1]
 
-def node_synthesizer(state: AgentState):
-    print("   ⚖️  Sintetizando resultados...")
+def format_entries(entries):
+    """Texto de entrada de un prompt de sintesis, recortado a SYNTHESIS_TOKEN_BUDGET."""
+    texts = fit_to_budget([text for _, _, text in entries], SYNTHESIS_TOKEN_BUDGET)
+    return "\n\n".join(f"{label}: {text}" for (label, _, _), text in zip(entries, texts))
+
+async def summarize_group(question, entries):
+    if len(entries) == 1:
+        return entries[0]
+    names = [name for _, members, _ in entries for name in members]
+    with stage_timer("prompt_render"):
+        prompt_value = GROUP_SUMMARY_PROMPT.format_prompt(
+            query=question, logs=format_entries(entries), perspectives=describe_perspectives(names)
+        )
+    response = await call_llm(prompt_value)
+    report_prompt_tokens(prompt_value, response)
+    return (f"GRUPO ({', '.join(names)})", names, response.content.strip())
+
+async def reduce_logs(question, entries):
+    """
+    Sintesis jerarquica: mientras haya mas de SYNTHESIS_GROUP_SIZE entradas se
+    resumen por grupos, todos los grupos de un nivel en paralelo. Con N agentes
+    la sintesis tarda ~log(N) llamadas en serie y ningun prompt crece con N.
+    Cada entrada es (etiqueta, agentes que cubre, texto).
+    """
+    while len(entries) > SYNTHESIS_GROUP_SIZE:
+        groups = [entries[i:i + SYNTHESIS_GROUP_SIZE] for i in range(0, len(entries), SYNTHESIS_GROUP_SIZE)]
+        with stage_timer("group_summary"):
+            entries = list(await asyncio.gather(*(
+                summarize_group(question, group) for group in groups
+            )))
+    return entries
+
+async def node_synthesizer(state: AgentState):
+    print(f"   ⚖️  [{request_id.get()}] Sintetizando resultados...")
+    current_agent.set("Synthesizer")
     logs = state["analysis_logs"]
     question = state["question"]
-    
-    logs_text = "\n\n".join([
-        f"AGENTE {log['agent']}: {log['thought']}" 
-        for log in logs
-    ])
-    
-    template = """
-    Eres 'The Historian'. Sintetiza los pensamientos de tres agentes ante: "{query}"
-    
-    INPUT:
-    {logs}
-    
-    INSTRUCCIONES:
-    Genera una 'Síntesis Narrativa' breve (máx 120 palabras).
-    Contrasta el miedo (Survivor), la frialdad financiera (Speculator) y la melancolía (Auteur).
-    Concluye con una reflexión sobre la disonancia cognitiva social que sirva para un estudio academico.
-    """
-    
-    prompt = PromptTemplate.from_template(template)
-    chain = prompt | llm
-    response = chain.invoke({"query": question, "logs": logs_text})
-    
-    # Limpieza también para el Historiador
-    synthesis_text = response.content.replace("Síntesis Narrativa:", "").strip()
-    
+
+    entries = [(f"AGENTE {log['agent']}", [log["agent"]], log["thought"]) for log in logs]
+
+    try:
+        with stage_timer("synthesis"):
+            entries = await reduce_logs(question, entries)
+            with stage_timer("prompt_render"):
+                prompt_value = SYNTHESIS_PROMPT.format_prompt(
+                    query=question,
+                    logs=format_entries(entries),
+                    agent_count=len(logs),
+                    perspectives=describe_perspectives([log["agent"] for log in logs])
+                )
+            response = await call_llm(prompt_value)
+            report_prompt_tokens(prompt_value, response)
+
+            # Limpieza también para el Historiador
+            synthesis_text = response.content.replace("Síntesis Narrativa:", "").strip()
+    except Exception as e:
+        AGENT_ERRORS.labels(agent="Synthesizer").inc()
+        print(f"   ❌ [{request_id.get()}] Synthesizer falló: {e}")
+        synthesis_text = f"[ERROR DE SÍNTESIS]: {str(e)}"
+
     return {"final_synthesis": synthesis_text}
 
 # --- 6. CONSTRUCCIÓN DEL GRAFO ---
 
-workflow = StateGraph(AgentState)
-workflow.add_node("Survivor", node_survivor)
-workflow.add_node("Speculator", node_speculator)
-workflow.add_node("Auteur", node_auteur)
-workflow.add_node("Synthesizer", node_synthesizer)
+# Funciones que reciben (nombre_del_nodo, segundos) cada vez que un nodo termina.
+# Las usan el benchmark y las metricas para medir el tiempo por nodo.
+node_timing_observers = []
+
+def timed_node(name, fn):
+    async def wrapper(state: AgentState):
+        start = time.perf_counter()
+        try:
+            return await fn(state)
+        finally:
+            elapsed = time.perf_counter() - start
+            for observer in node_timing_observers:
+                observer(name, elapsed)
+    return wrapper
+
+def route_from(node_name):
+    """Modo secuencial: siguiente agente elegido despues de `node_name` (o el Synthesizer)."""
+    following = AGENT_ORDER[AGENT_ORDER.index(node_name) + 1:] if node_name in AGENT_ORDER else AGENT_ORDER
+    def route(state: AgentState):
+        chosen = selected_personas(state)
+        return next((name for name in following if name in chosen), "Synthesizer")
+    return route
+
+def build_graph(mode=GRAPH_MODE):
+    workflow = StateGraph(AgentState)
+    workflow.add_node("Embedder", timed_node("Embedder", node_embedder))
+    for agent_name in AGENT_ORDER:
+        workflow.add_node(agent_name, timed_node(agent_name, make_agent_node(agent_name)))
+    workflow.add_node("Synthesizer", timed_node("Synthesizer", node_synthesizer))
 
-workflow.set_entry_point("Survivor")
-workflow.add_edge("Survivor", "Speculator")
-workflow.add_edge("Speculator", "Auteur")
-workflow.add_edge("Auteur", "Synthesizer")
-workflow.add_edge("Synthesizer", END)
+    workflow.set_entry_point("Embedder")
+    if mode == "sequential":
+        for node_name in ["Embedder"] + AGENT_ORDER:
+            workflow.add_conditional_edges(node_name, route_from(node_name), AGENT_ORDER + ["Synthesizer"])
+    else:
+        # Fan-out: los agentes elegidos salen del Embedder en el mismo paso.
+        # Fan-in: como todos terminan en ese mismo paso, el Synthesizer se
+        # ejecuta una sola vez, en el siguiente, con todos los logs.
+        workflow.add_conditional_edges("Embedder", selected_personas, AGENT_ORDER)
+        for agent_name in AGENT_ORDER:
+            workflow.add_edge(agent_name, "Synthesizer")
 
-app_graph = workflow.compile()
\ No newline at end of file
+    workflow.add_edge("Synthesizer", END)
+    return workflow.compile()
+
+app_graph = build_graph()
+
+# --- 7. ARRANQUE ---
+ready = False
+
+def warm_up():
+    """
+    Inicializa todo lo pesado y hace una codificacion de prueba para que la
+    primera pregunta real no pague la carga del modelo. main.py expone el
+    resultado en /ready.
+    """
+    global ready
+    start = time.perf_counter()
+    model = get_embedding_model()
+    model.encode(["warm-up"])
+    get_llm()
+    if get_collection() is not None:
+        init_local_index()
+        if RETRIEVAL_QUERY_MODE == "centroid":
+            get_persona_vectors()
+    ready = True
+    print(f"🔥 Warm-up completado en {time.perf_counter() - start:.1f}s.")
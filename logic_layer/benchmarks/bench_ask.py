@@ -0,0 +1,143 @@
+# Benchmark de punta a punta de /ask. Levanta la app FastAPI en proceso (sin
+# red), reemplaza Gemini por FakeChatModel y Chroma por una coleccion en
+# memoria, y lanza N preguntas con la concurrencia indicada.
+#
+# Uso (desde logic_layer/):
+#   python benchmarks/bench_ask.py --requests 200 --concurrency 20 --output bench.json
+#   python benchmarks/bench_ask.py --fake-encoder --llm-latency 0.8 --llm-tps 120
+#   python benchmarks/bench_ask.py --fake-encoder --llm-slow-rate 0.05 --hedge   (cola larga + hedging)
+#
+# El JSON de salida incluye el commit actual para poder comparar corridas.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import subprocess
+from collections import defaultdict
+
+import numpy as np
+
+LOGIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, LOGIC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de /ask con LLM y Chroma locales")
+    parser.add_argument("--requests", type=int, default=100, help="Número total de preguntas")
+    parser.add_argument("--concurrency", type=int, default=10, help="Preguntas simultáneas")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Segundos hasta el primer token")
+    parser.add_argument("--llm-tps", type=float, default=200.0, help="Tokens por segundo del modelo falso")
+    parser.add_argument("--llm-tokens", type=int, default=80, help="Tokens por respuesta")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="Fracción de llamadas lentas (cola larga)")
+    parser.add_argument("--llm-slow-latency", type=float, default=5.0, help="Segundos de una llamada lenta")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="Fracción de llamadas con error transitorio")
+    parser.add_argument("--llm-timeout", type=float, help="Deadline por intento (por defecto LLM_TIMEOUT)")
+    parser.add_argument("--llm-deadline", type=float, help="Deadline total por llamada (por defecto LLM_DEADLINE)")
+    parser.add_argument("--hedge", action="store_true", help="Activar hedged requests tras el p95")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Latencia simulada de Chroma (s)")
+    parser.add_argument("--docs-per-source", type=int, default=5000, help="Documentos por partición")
+    parser.add_argument("--fake-encoder", action="store_true", help="Usar encoder determinista en vez de MiniLM")
+    parser.add_argument("--use-cache", action="store_true", help="No enviar bypass_cache (mide también el cache)")
+    parser.add_argument("--unique-questions", type=int, default=0,
+                        help="Cantidad de preguntas distintas (0 = todas distintas)")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    return parser.parse_args()
+
+def percentiles(values):
+    if not values:
+        return {}
+    arr = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(arr.mean()), 2),
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "max_ms": round(float(arr.max()), 2)
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=LOGIC_DIR, text=True).strip()
+    except Exception:
+        return None
+
+def peak_rss_mb():
+    # En Linux ru_maxrss viene en KB; en macOS en bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+async def run(args):
+    import httpx
+    import agents
+    import main
+    from fakes import FakeChatModel, FakeEncoder, InMemoryCollection
+
+    # --- INYECCION DE DOBLES ---
+    agents.llm = FakeChatModel(latency=args.llm_latency, tokens_per_second=args.llm_tps,
+                               response_tokens=args.llm_tokens, slow_rate=args.llm_slow_rate,
+                               slow_latency=args.llm_slow_latency, failure_rate=args.llm_failure_rate)
+    agents.llm_client.hedge = args.hedge
+    if args.llm_timeout:
+        agents.llm_client.timeout = args.llm_timeout
+    if args.llm_deadline:
+        agents.llm_client.deadline = args.llm_deadline
+    agents.collection = InMemoryCollection(docs_per_source=args.docs_per_source, latency=args.db_latency)
+    agents.local_index = None
+    if args.fake_encoder:
+        agents.embedding_model = FakeEncoder()
+
+    node_timings = defaultdict(list)
+    agents.node_timing_observers.append(lambda node, seconds: node_timings[node].append(seconds))
+
+    unique = args.unique_questions or args.requests
+    questions = [f"¿Cómo cambió la percepción del miedo? variante {i % unique}" for i in range(args.requests)]
+
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(question):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/ask", json={"question": question, "bypass_cache": not args.use_cache})
+                elapsed = time.perf_counter() - start
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in questions))
+        wall = time.perf_counter() - wall_start
+
+    return {
+        "commit": git_commit(),
+        "config": vars(args),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "errors": errors,
+        "latency": percentiles(latencies),
+        "nodes": {node: percentiles(values) for node, values in sorted(node_timings.items())},
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Sin credenciales reales: el cliente de Gemini se construye pero nunca se usa
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    # El benchmark no debe leer ni escribir el cache persistente del servidor
+    os.environ.pop("RESPONSE_CACHE_FILE", None)
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados guardados en {args.output}")
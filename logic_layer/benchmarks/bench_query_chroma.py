@@ -0,0 +1,87 @@
+# Micro-benchmark de la etapa de recuperacion: codificacion de consultas
+# (una a una vs. en batch, con y sin cache) y query_chroma contra la coleccion
+# en memoria, con el backend de Chroma o el indice local.
+#
+# Uso (desde logic_layer/):
+#   python benchmarks/bench_query_chroma.py --iterations 200 --output retrieval.json
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ask import percentiles, git_commit, peak_rss_mb
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de query_chroma")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--docs-per-source", type=int, default=15000)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Latencia simulada de Chroma (s)")
+    parser.add_argument("--fake-encoder", action="store_true")
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+def timed(fn, iterations):
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+def main(args):
+    import agents
+    from fakes import FakeEncoder, InMemoryCollection
+    from vector_index import LocalVectorIndex
+
+    if args.fake_encoder:
+        agents.embedding_model = FakeEncoder()
+    agents.collection = InMemoryCollection(docs_per_source=args.docs_per_source, latency=args.db_latency)
+    agents.local_index = None
+
+    def questions(i):
+        return [agents.build_search_query(f"pregunta de prueba {i}", name) for name in agents.AGENT_ORDER]
+
+    results = {"commit": git_commit(), "config": vars(args)}
+
+    # --- CODIFICACION ---
+    results["encode_single"] = timed(
+        lambda i: [agents.get_embedding_model().encode([q]) for q in questions(i)], args.iterations)
+    results["encode_batched"] = timed(
+        lambda i: agents.get_embedding_model().encode(questions(i)), args.iterations)
+    agents.query_embedding_cache.clear()
+    results["encode_cached_cold"] = timed(lambda i: agents.encode_queries(questions(i)), args.iterations)
+    results["encode_cached_warm"] = timed(lambda i: agents.encode_queries(questions(i)), args.iterations)
+
+    # --- RECUPERACION ---
+    embeddings = [agents.encode_queries(questions(i)) for i in range(args.iterations)]
+    source = agents.AGENTS_CONFIG[agents.AGENT_ORDER[0]]["source_filter"]
+
+    results["query_chroma_collection"] = timed(
+        lambda i: agents.query_chroma("", source, query_embedding=embeddings[i][0]), args.iterations)
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        agents.local_index = LocalVectorIndex(agents.collection, snapshot_dir)
+        agents.local_index.load([source])
+        results["query_chroma_local_index"] = timed(
+            lambda i: agents.query_chroma("", source, query_embedding=embeddings[i][0]), args.iterations)
+        agents.local_index = None
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+    results = main(args)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados guardados en {args.output}")
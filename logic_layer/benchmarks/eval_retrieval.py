@@ -0,0 +1,159 @@
+# Evaluacion de la recuperacion: compara el modo de consulta actual
+# ("keywords": pregunta + palabras clave codificadas por personaje) con el modo
+# "centroid" (pregunta codificada una vez + vector fijo del personaje) sobre un
+# conjunto fijo de preguntas (eval_queries.json).
+#
+# No hay etiquetas manuales: un documento de la particion del personaje cuenta
+# como relevante si contiene alguno de los `relevant_terms` de la pregunta.
+# recall@k = relevantes recuperados / min(k, relevantes en la particion).
+#
+# Uso (desde logic_layer/, con Chroma cargado por el ETL):
+#   python benchmarks/eval_retrieval.py --weights 0.3 0.5 1.0 --output eval.json
+#   python benchmarks/eval_retrieval.py --fake   -> solo verifica que corre (recall sin sentido)
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ask import percentiles, git_commit
+
+QUERIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_queries.json")
+PAGE_SIZE = 5000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recall de la recuperacion: keywords vs. centroid")
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument("--k", type=int, help="Documentos por consulta (por defecto el `k` de cada personaje)")
+    parser.add_argument("--weights", type=float, nargs="+", default=[0.5], help="Valores de PERSONA_VECTOR_WEIGHT a evaluar")
+    parser.add_argument("--fake", action="store_true", help="Coleccion en memoria y encoder determinista")
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+def partition_documents(collection, source_tag):
+    """Todos los documentos de una particion, leidos por paginas."""
+    documents = []
+    while True:
+        page = collection.get(where={"source": source_tag}, include=["documents"], limit=PAGE_SIZE, offset=len(documents))
+        documents.extend(page["documents"])
+        if len(page["documents"]) < PAGE_SIZE:
+            return documents
+
+def relevant_documents(documents, terms):
+    terms = [term.lower() for term in terms]
+    return {doc.strip() for doc in documents if any(term in doc.lower() for term in terms)}
+
+class CountingEncoder:
+    """Envuelve el modelo de embeddings para contar los textos que codifica."""
+    def __init__(self, model):
+        self.model = model
+        self.texts = 0
+
+    def encode(self, texts, **kwargs):
+        self.texts += len(texts)
+        return self.model.encode(texts, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+def evaluate(agents, queries, relevant, k_override, encoder):
+    """Corre el conjunto de preguntas en el modo configurado en agents y devuelve las metricas."""
+    agents.query_embedding_cache.clear()
+    agents.persona_vectors.clear()
+    if agents.RETRIEVAL_QUERY_MODE == "centroid":
+        agents.get_persona_vectors()  # Costo fijo, fuera de la medicion por pregunta
+
+    recalls, hits, encodes, samples, retrieved = [], [], [], [], []
+    for query, relevant_docs in zip(queries, relevant):
+        config = agents.AGENTS_CONFIG[query["persona"]]
+        k = k_override or config["k"]
+
+        before = encoder.texts
+        start = time.perf_counter()
+        # Se codifica como en una peticion real (todos los personajes) y se
+        # recupera para el personaje de la pregunta
+        embeddings = agents.persona_query_embeddings([query["question"]], agents.AGENT_ORDER)[0]
+        docs = agents.retrieve([embeddings[query["persona"]]], config["source_filter"], k)[0]
+        samples.append(time.perf_counter() - start)
+        encodes.append(encoder.texts - before)
+
+        found = len(set(docs) & relevant_docs)
+        recalls.append(found / min(k, len(relevant_docs)) if relevant_docs else 0.0)
+        hits.append(found > 0)
+        retrieved.append(docs)
+
+    return {
+        "recall_at_k": round(float(np.mean(recalls)), 3),
+        "hit_rate": round(float(np.mean(hits)), 3),
+        "encodes_per_request": round(float(np.mean(encodes)), 2),
+        "latency": percentiles(samples),
+        "per_query_recall": [round(r, 3) for r in recalls]
+    }, retrieved
+
+def overlap(a, b):
+    """Jaccard medio entre los documentos recuperados por dos modos."""
+    scores = [len(set(x) & set(y)) / len(set(x) | set(y)) if (x or y) else 1.0 for x, y in zip(a, b)]
+    return round(float(np.mean(scores)), 3)
+
+def main(args):
+    import agents
+    from fakes import FakeEncoder, InMemoryCollection
+
+    if args.fake:
+        agents.embedding_model = FakeEncoder()
+        agents.collection = InMemoryCollection(docs_per_source=2000)
+    collection = agents.get_collection()
+    if collection is None:
+        sys.exit("❌ No hay conexión a Chroma (usa --fake para una corrida local).")
+    agents.local_index = None
+    encoder = CountingEncoder(agents.get_embedding_model())
+    agents.embedding_model = encoder
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [q for q in json.load(f) if q["persona"] in agents.AGENTS_CONFIG]
+
+    print(f"📚 Cargando particiones para {len(queries)} preguntas...")
+    partitions = {}
+    for query in queries:
+        source = agents.AGENTS_CONFIG[query["persona"]]["source_filter"]
+        if source not in partitions:
+            partitions[source] = partition_documents(collection, source)
+    relevant = [
+        relevant_documents(partitions[agents.AGENTS_CONFIG[q["persona"]]["source_filter"]], q["relevant_terms"])
+        for q in queries
+    ]
+
+    results = {"commit": git_commit(), "config": vars(args), "queries": [q["question"] for q in queries],
+               "relevant_counts": [len(r) for r in relevant], "modes": {}}
+
+    agents.RETRIEVAL_QUERY_MODE = "keywords"
+    results["modes"]["keywords"], baseline = evaluate(agents, queries, relevant, args.k, encoder)
+
+    agents.RETRIEVAL_QUERY_MODE = "centroid"
+    for weight in args.weights:
+        agents.PERSONA_VECTOR_WEIGHT = weight
+        metrics, retrieved = evaluate(agents, queries, relevant, args.k, encoder)
+        metrics["overlap_with_keywords"] = overlap(baseline, retrieved)
+        results["modes"][f"centroid@{weight}"] = metrics
+
+    print(f"\n{'modo':<16}{'recall@k':>10}{'hit rate':>10}{'encodes':>10}{'p50 ms':>10}")
+    for mode, metrics in results["modes"].items():
+        print(f"{mode:<16}{metrics['recall_at_k']:>10}{metrics['hit_rate']:>10}"
+              f"{metrics['encodes_per_request']:>10}{metrics['latency']['p50_ms']:>10}")
+    return results
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+    results = main(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados guardados en {args.output}")
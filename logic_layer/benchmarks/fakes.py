@@ -0,0 +1,162 @@
+# Dobles locales para medir el rendimiento de la capa logica sin depender de
+# Gemini ni del servidor Chroma: un chat model con latencia y velocidad de
+# tokens configurables, una coleccion en memoria con la misma interfaz que
+# chromadb y un encoder determinista para corridas rapidas.
+
+import asyncio
+import random
+import time
+import zlib
+from typing import Any, List
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+class FakeChatModel(BaseChatModel):
+    """
+    Reemplazo de ChatGoogleGenerativeAI. Espera `latency` segundos antes del
+    primer token y luego emite `response_tokens` tokens a `tokens_per_second`.
+    Para probar la capa de resiliencia, una fraccion `slow_rate` de las llamadas
+    tarda `slow_latency` (cola larga) y una fraccion `failure_rate` falla con un
+    error transitorio.
+    """
+    latency: float = 0.5
+    tokens_per_second: float = 200.0
+    response_tokens: int = 80
+    slow_rate: float = 0.0
+    slow_latency: float = 5.0
+    failure_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _text(self) -> List[str]:
+        return ["palabra "] * self.response_tokens
+
+    def _first_token_latency(self) -> float:
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise ConnectionError("503 UNAVAILABLE (fallo simulado)")
+        if self.slow_rate and random.random() < self.slow_rate:
+            return self.slow_latency
+        return self.latency
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._first_token_latency() + self.response_tokens / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self._text())))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._first_token_latency() + self.response_tokens / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self._text())))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self._first_token_latency())
+        for token in self._text():
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+class FakeEncoder:
+    """Encoder determinista (hash del texto -> vector normalizado), sin torch."""
+    def __init__(self, dim=384, seconds_per_text=0.0):
+        self.dim = dim
+        self.seconds_per_text = seconds_per_text
+
+    def encode(self, texts, **kwargs):
+        if self.seconds_per_text:
+            time.sleep(self.seconds_per_text * len(texts))
+        vectors = np.stack([
+            np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(self.dim)
+            for t in texts
+        ]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+class InMemoryCollection:
+    """
+    Coleccion en memoria compatible con las llamadas que hace la capa logica
+    (query, get, count). `latency` simula el round-trip de red al servidor.
+    """
+    def __init__(self, docs_per_source=5000, sources=("survivor_context", "speculator_context", "auteur_context"),
+                 dim=384, latency=0.0, seed=0):
+        rng = np.random.default_rng(seed)
+        self.latency = latency
+        self.ids, self.documents, self.metadatas = [], [], []
+        for source in sources:
+            for i in range(docs_per_source):
+                self.ids.append(f"{source}_{i}")
+                self.documents.append(f"Tweet sintético {i} de {source}")
+                # Abril-junio de 2020, un documento cada ~20 minutos
+                epoch = 1585699200 + (i * 1237) % 7862400
+                self.metadatas.append({"source": source, "type": "bench", "date": str(epoch), "epoch": epoch})
+        embeddings = rng.standard_normal((len(self.ids), dim)).astype(np.float32)
+        self.embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    def count(self):
+        return len(self.ids)
+
+    def _matches(self, metadata, where):
+        if not where:
+            return True
+        for key, condition in where.items():
+            if key == "$and":
+                if not all(self._matches(metadata, sub) for sub in condition):
+                    return False
+            elif key == "$or":
+                if not any(self._matches(metadata, sub) for sub in condition):
+                    return False
+            elif isinstance(condition, dict):
+                value = metadata.get(key)
+                for op, target in condition.items():
+                    if value is None:
+                        return False
+                    if op == "$eq" and value != target: return False
+                    if op == "$ne" and value == target: return False
+                    if op == "$gt" and not value > target: return False
+                    if op == "$gte" and not value >= target: return False
+                    if op == "$lt" and not value < target: return False
+                    if op == "$lte" and not value <= target: return False
+                    if op == "$in" and value not in target: return False
+            elif metadata.get(key) != condition:
+                return False
+        return True
+
+    def _select(self, where=None, ids=None):
+        wanted = set(ids) if ids is not None else None
+        return np.array([
+            i for i, meta in enumerate(self.metadatas)
+            if self._matches(meta, where) and (wanted is None or self.ids[i] in wanted)
+        ], dtype=np.int64)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        if self.latency:
+            time.sleep(self.latency)
+        rows = self._select(where)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            scores = self.embeddings[rows] @ query if len(rows) else np.array([])
+            top = rows[np.argsort(-scores)[:n_results]] if len(rows) else rows
+            result["ids"].append([self.ids[i] for i in top])
+            result["documents"].append([self.documents[i] for i in top])
+            result["metadatas"].append([self.metadatas[i] for i in top])
+            result["distances"].append([float(2 - 2 * self.embeddings[i] @ query) for i in top])
+            result["embeddings"].append([self.embeddings[i].tolist() for i in top])
+        return result
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include=("documents", "metadatas")):
+        if self.latency:
+            time.sleep(self.latency)
+        rows = self._select(where, ids)
+        rows = rows[offset:offset + limit] if limit else rows[offset:]
+        return {
+            "ids": [self.ids[i] for i in rows],
+            "documents": [self.documents[i] for i in rows],
+            "metadatas": [self.metadatas[i] for i in rows],
+            "embeddings": self.embeddings[rows] if len(rows) else np.empty((0, self.embeddings.shape[1]))
+        }
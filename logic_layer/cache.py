@@ -0,0 +1,57 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Cache LRU en memoria acotada por numero de entradas y por tiempo de vida (TTL).
+# Es seguro entre hilos porque los embeddings se calculan en el pool de hilos
+# de agents.py mientras el event loop sigue atendiendo peticiones.
+
+class TTLCache:
+    def __init__(self, max_entries=1024, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # key -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if self.ttl_seconds and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            # Marcamos la entrada como la mas reciente
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,60 @@
+import numpy as np
+
+# Centroides por particion (`source`) de project_archive: la media normalizada
+# de los embeddings de cada particion. El ETL los calcula al terminar la ingesta
+# y los guarda en su propia coleccion; la capa logica los usa para orientar la
+# pregunta hacia el dataset de cada personaje sin volver a codificar nada
+# (RETRIEVAL_QUERY_MODE=centroid en agents.py).
+CENTROID_COLLECTION = "persona_centroids"
+CENTROID_PAGE_SIZE = 5000
+
+def normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+def compute_source_centroids(collection, source_tags, page_size=CENTROID_PAGE_SIZE):
+    """
+    Recorre cada particion por paginas (collection.get con offset) acumulando la
+    suma de embeddings, asi la memoria no depende del tamaño de la coleccion.
+    Devuelve {source: (centroide, cantidad de documentos)}; las particiones
+    vacias no aparecen.
+    """
+    centroids = {}
+    for tag in source_tags:
+        total = None
+        count = 0
+        while True:
+            page = collection.get(where={"source": tag}, include=["embeddings"], limit=page_size, offset=count)
+            embeddings = page.get("embeddings")
+            if embeddings is None or len(embeddings) == 0:
+                break
+            embeddings = np.asarray(embeddings, dtype=np.float64)
+            total = embeddings.sum(axis=0) if total is None else total + embeddings.sum(axis=0)
+            count += len(embeddings)
+            if len(embeddings) < page_size:
+                break
+        if count:
+            centroids[tag] = (normalize(total / count), count)
+    return centroids
+
+def store_centroids(client, centroids):
+    """Guarda (upsert) los centroides en CENTROID_COLLECTION, un registro por particion."""
+    if not centroids:
+        return
+    tags = list(centroids)
+    client.get_or_create_collection(name=CENTROID_COLLECTION).upsert(
+        ids=tags,
+        embeddings=[centroids[tag][0].tolist() for tag in tags],
+        metadatas=[{"source": tag, "count": centroids[tag][1]} for tag in tags]
+    )
+
+def load_centroids(client, source_tags):
+    """Lee los centroides guardados por el ETL. Devuelve {source: centroide} ({} si no existen)."""
+    try:
+        stored = client.get_collection(CENTROID_COLLECTION).get(ids=list(source_tags), include=["embeddings"])
+    except Exception:
+        return {}
+    embeddings = stored.get("embeddings")
+    if embeddings is None:
+        return {}
+    return {tag: normalize(embedding) for tag, embedding in zip(stored["ids"], embeddings)}
@@ -0,0 +1,3 @@
+# test_logic.py y test_connection_todb.py son scripts manuales contra los
+# servicios levantados (Logic Layer y ChromaDB), no pruebas de pytest.
+collect_ignore = ["test_logic.py", "test_connection_todb.py"]
@@ -0,0 +1,57 @@
+import re
+import html
+import hashlib
+
+import numpy as np
+
+# Colapso de casi-duplicados y diversidad del contexto recuperado. Lo usan el
+# ETL (para guardar el cluster de cada tweet en sus metadatos) y la capa logica
+# (para quedarse con un solo documento por cluster y, opcionalmente, aplicar MMR).
+
+URL_RE = re.compile(r"https?://\S+|www\.\S+")
+MENTION_RE = re.compile(r"@\w+")
+RETWEET_RE = re.compile(r"\brt\b")
+NON_WORD_RE = re.compile(r"[^\w\s]")
+
+def normalize_for_dedup(text):
+    """
+    Forma canonica de un tweet para detectar casi-duplicados: sin URLs, menciones,
+    marcas de retweet, entidades HTML, puntuacion ni emojis, en minusculas y con
+    espacios simples. Dos retweets del mismo texto quedan identicos.
+    """
+    text = html.unescape(text).lower()
+    text = URL_RE.sub(" ", text)
+    text = MENTION_RE.sub(" ", text)
+    text = RETWEET_RE.sub(" ", text)
+    text = NON_WORD_RE.sub(" ", text)
+    return " ".join(text.split())
+
+def dup_cluster_id(text):
+    """ID del cluster de casi-duplicados: hash del texto normalizado."""
+    normalized = normalize_for_dedup(text) or text.strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+def mmr_select(query_embedding, candidate_embeddings, k, lambda_mult=0.7):
+    """
+    Maximal Marginal Relevance: elige k candidatos equilibrando similitud con la
+    consulta (lambda_mult) y diferencia con los ya elegidos (1 - lambda_mult).
+    Devuelve los indices elegidos en orden de seleccion.
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if len(candidates) == 0:
+        return []
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(np.linalg.norm(query), 1e-12)
+
+    relevance = candidates @ query
+    selected = [int(np.argmax(relevance))]
+    max_similarity = candidates @ candidates[selected[0]]
+
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        max_similarity = np.maximum(max_similarity, candidates @ candidates[chosen])
+    return selected
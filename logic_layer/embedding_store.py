@@ -0,0 +1,124 @@
+import os
+import re
+import hashlib
+import threading
+
+import numpy as np
+
+# Almacen de embeddings direccionado por contenido que usa el ETL
+# (data_layer/etl_script.py). Cada texto se identifica por
+# sha1(modelo + texto) y su vector vive en una fila de un archivo float32
+# mapeado en memoria. Asi, reconstruir la coleccion o cambiar de servidor Chroma
+# no requiere volver a pasar por el modelo los textos que no cambiaron.
+#
+# Estructura en disco (una carpeta por modelo):
+#   vectors.f32  -> matriz (n, dim) float32, solo se agregan filas al final
+#   index.bin    -> registros de 24 bytes: digest sha1 (20) + fila uint32 (4)
+#
+# Pensado para un solo proceso escritor a la vez por carpeta. La capa logica no
+# lo usa: sus consultas nunca coinciden con textos de documentos y la
+# reutilizacion de consultas ya la cubre el cache de embeddings de agents.py.
+
+DIGEST_SIZE = 20
+# "V" (bytes crudos) y no "S": numpy recorta los bytes nulos finales de los "S"
+RECORD_DTYPE = np.dtype([("digest", f"V{DIGEST_SIZE}"), ("row", "<u4")])
+
+class EmbeddingStore:
+    def __init__(self, directory, model_name, dim):
+        self.model_name = model_name
+        self.dim = dim
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.index_path = os.path.join(self.directory, "index.bin")
+
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._vectors = None
+        self._mapped_rows = 0
+        self.hits = 0
+        self.misses = 0
+        self._open()
+
+    def _open(self):
+        stored_rows = 0
+        if os.path.exists(self.vectors_path):
+            stored_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        if os.path.exists(self.index_path):
+            records = np.fromfile(self.index_path, dtype=RECORD_DTYPE)
+            # Ignoramos registros que apunten a filas incompletas (escritura interrumpida)
+            for digest, row in zip(records["digest"], records["row"]):
+                if row < stored_rows:
+                    self._rows[bytes(digest)] = int(row)
+        self._remap(stored_rows)
+
+    def _remap(self, rows):
+        if rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        self._mapped_rows = rows
+
+    def _digest(self, text):
+        return hashlib.sha1(f"{self.model_name}\x1f{text}".encode("utf-8")).digest()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def stats(self):
+        return {"entries": len(self._rows), "model": self.model_name, "hits": self.hits, "misses": self.misses}
+
+    # --- LECTURA / ESCRITURA ---
+
+    def get_many(self, texts):
+        """Devuelve una lista con el vector de cada texto o None si no esta guardado."""
+        with self._lock:
+            found = []
+            for text in texts:
+                row = self._rows.get(self._digest(text))
+                found.append(np.array(self._vectors[row]) if row is not None else None)
+            return found
+
+    def put_many(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+        with self._lock:
+            new_digests, new_vectors, pending = [], [], set()
+            for text, vector in zip(texts, vectors):
+                digest = self._digest(text)
+                if digest not in self._rows and digest not in pending:
+                    pending.add(digest)
+                    new_digests.append(digest)
+                    new_vectors.append(vector)
+            if not new_digests:
+                return
+
+            first_row = self._mapped_rows
+            # Primero los vectores y luego el indice: si el proceso muere en medio,
+            # el indice nunca apunta a datos que no existen.
+            with open(self.vectors_path, "ab") as f:
+                np.stack(new_vectors).astype(np.float32).tofile(f)
+            records = np.empty(len(new_digests), dtype=RECORD_DTYPE)
+            records["digest"] = new_digests
+            records["row"] = np.arange(first_row, first_row + len(new_digests), dtype=np.uint32)
+            with open(self.index_path, "ab") as f:
+                records.tofile(f)
+
+            for digest, row in zip(new_digests, records["row"]):
+                self._rows[digest] = int(row)
+            self._remap(first_row + len(new_digests))
+
+    def encode(self, texts, encode_fn):
+        """
+        Devuelve la matriz de embeddings de `texts`. Solo los textos que no estan
+        en el almacen se pasan por `encode_fn` (en un solo batch) y se guardan.
+        """
+        found = self.get_many(texts)
+        missing = [i for i, vector in enumerate(found) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            encoded = np.asarray(encode_fn([texts[i] for i in missing]), dtype=np.float32)
+            self.put_many([texts[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                found[i] = vector
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack(found)
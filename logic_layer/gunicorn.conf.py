@@ -0,0 +1,37 @@
+# Configuracion de gunicorn para correr varios workers uvicorn compartiendo el
+# modelo de embeddings. Con preload_app el proceso maestro importa main.py una
+# sola vez (cargando los pesos, que safetensors ya abre mapeados en memoria) y
+# luego hace fork: los workers heredan esas paginas copy-on-write en vez de
+# tener cada uno su propia copia del modelo.
+#
+# Lo que no es seguro compartir entre procesos (conexion HTTP a Chroma, pool de
+# hilos, primera inferencia de torch) se crea despues del fork, en el warm-up
+# que cada worker lanza desde el lifespan de FastAPI.
+#
+# Las metricas de Prometheus usan el modo multiproceso (ver metrics.py): cada
+# worker escribe en PROMETHEUS_MULTIPROC_DIR y /metrics suma todos. La carpeta
+# se vacia aqui, antes de importar la app, y child_exit da de baja a los
+# workers que terminan.
+
+import os
+import shutil
+
+os.environ.setdefault("PRELOAD_MODELS", "1")
+multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/anima_prometheus")
+shutil.rmtree(multiproc_dir, ignore_errors=True)
+os.makedirs(multiproc_dir, exist_ok=True)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+    try:
+        os.remove(os.path.join(multiproc_dir, f"cache_stats_{worker.pid}.json"))
+    except OSError:
+        pass
@@ -0,0 +1,185 @@
+import time
+import random
+import asyncio
+import contextvars
+from collections import deque
+
+import numpy as np
+
+from metrics import stage_timer, LLM_RETRIES, LLM_HEDGES, LLM_FALLBACKS
+
+# Capa de resiliencia entre los nodos del grafo y el LLM. Todas las llamadas
+# pasan por LLMClient.ainvoke, que aplica en este orden:
+#   1. limite de tasa (token bucket) y de concurrencia del proceso
+#   2. deadline por intento
+#   3. hedging opcional: si la llamada tarda mas que el p95 reciente se lanza
+#      una segunda identica y se usa la que termine primero
+#   4. reintentos con backoff exponencial (con jitter) ante errores transitorios
+#   5. modelo de respaldo si el principal sigue fallando por un error transitorio
+# Todo eso ocurre dentro de un deadline total por ainvoke (`deadline`), acotado
+# ademas por el deadline de la peticion HTTP en curso (request_deadline), para
+# que la latencia de cola no supere el timeout de lectura de la capa de
+# presentacion: un intento lento no se reintenta si ya no queda tiempo.
+
+# Instante (time.monotonic) en que vence la peticion en curso; lo fija main.py.
+request_deadline = contextvars.ContextVar("llm_request_deadline", default=None)
+
+# Errores que vale la pena reintentar: cuota (429), servidor (5xx), red y timeouts.
+# Se reconocen por nombre para no depender de las clases de google-api-core.
+TRANSIENT_ERROR_NAMES = {
+    "TimeoutError", "ConnectionError", "ResourceExhausted", "ServiceUnavailable",
+    "DeadlineExceeded", "InternalServerError", "TooManyRequests", "ServerError"
+}
+TRANSIENT_MARKERS = ("429", "500", "503", "504", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED")
+
+def is_transient(error):
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    message = str(error)
+    return any(marker in message for marker in TRANSIENT_MARKERS)
+
+def remaining(deadline):
+    """Segundos que quedan hasta `deadline` (infinito si no hay)."""
+    return float("inf") if deadline is None else deadline - time.monotonic()
+
+class TokenBucket:
+    """Limitador de tasa: `rate` llamadas por segundo con rafagas de hasta `capacity`."""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class LLMClient:
+    """
+    `primary` y `fallback` son funciones que devuelven el modelo (se resuelven en
+    cada llamada para respetar la carga perezosa y los dobles de los benchmarks).
+    """
+    def __init__(self, primary, fallback=None, timeout=30.0, deadline=None, max_retries=2, retry_base=0.5,
+                 retry_max_delay=8.0, hedge=False, hedge_min_delay=1.0, hedge_min_samples=20,
+                 max_concurrency=32, requests_per_minute=0, burst=10):
+        self.primary = primary
+        self.fallback = fallback
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max_delay = retry_max_delay
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        # Latencias recientes de llamadas exitosas, para calcular el umbral de hedging
+        self.latencies = deque(maxlen=200)
+
+    def hedge_delay(self):
+        """Segundos a esperar antes de lanzar la llamada duplicada (None = sin hedging)."""
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return max(float(np.percentile(self.latencies, 95)), self.hedge_min_delay)
+
+    def call_deadline(self):
+        """Instante en que vence esta llamada: el menor entre el propio y el de la peticion."""
+        deadline = request_deadline.get()
+        if self.deadline:
+            own = time.monotonic() + self.deadline
+            deadline = own if deadline is None else min(deadline, own)
+        return deadline
+
+    async def ainvoke(self, prompt_value):
+        deadline = self.call_deadline()
+        if deadline is None:
+            return await self._invoke(prompt_value, None)
+        budget = deadline - time.monotonic()
+        try:
+            # Cubre tambien la espera del limite de tasa y del cupo de concurrencia
+            return await asyncio.wait_for(self._invoke(prompt_value, deadline), timeout=max(budget, 0))
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"deadline del LLM agotado ({max(budget, 0):.1f}s)") from None
+
+    async def _invoke(self, prompt_value, deadline):
+        try:
+            return await self._with_retries(self.primary(), prompt_value, deadline)
+        except Exception as e:
+            # Solo los errores transitorios pasan al respaldo: una peticion invalida
+            # o bloqueada fallaria igual en el otro modelo y solo gastaria cuota.
+            if self.fallback is None or not is_transient(e) or remaining(deadline) <= 0:
+                raise
+            LLM_FALLBACKS.inc()
+            print(f"   🛟 Modelo principal falló ({e!r}); usando el modelo de respaldo.")
+            return await self._call(self.fallback(), prompt_value, deadline)
+
+    async def _with_retries(self, model, prompt_value, deadline):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._hedged(model, prompt_value, deadline)
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    raise
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+                delay = min(self.retry_max_delay, self.retry_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                if remaining(deadline) <= delay:
+                    raise  # No alcanza el tiempo para otro intento
+                LLM_RETRIES.labels(reason=reason).inc()
+                print(f"   🔁 Reintento {attempt + 1}/{self.max_retries} del LLM en {delay:.1f}s ({reason})")
+                await asyncio.sleep(delay)
+
+    async def _hedged(self, model, prompt_value, deadline):
+        delay = self.hedge_delay()
+        if delay is None or remaining(deadline) <= delay:
+            return await self._call(model, prompt_value, deadline)
+
+        tasks = [asyncio.ensure_future(self._call(model, prompt_value, deadline))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+
+            tasks.append(asyncio.ensure_future(self._call(model, prompt_value, deadline)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.labels(winner="primary" if task is tasks[0] else "hedge").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # La llamada perdedora (o ambas, si nos cancelan) no sigue consumiendo cuota
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _call(self, model, prompt_value, deadline=None):
+        """Una llamada al modelo con limite de tasa, cupo de concurrencia y deadline."""
+        with stage_timer("llm_queue"):
+            await self.bucket.acquire()
+            await self.slots.acquire()
+        try:
+            start = time.perf_counter()
+            timeout = min(self.timeout, remaining(deadline))
+            if timeout <= 0:
+                raise asyncio.TimeoutError("deadline del LLM agotado")
+            with stage_timer("llm_call"):
+                response = await asyncio.wait_for(model.ainvoke(prompt_value), timeout=timeout)
+            self.latencies.append(time.perf_counter() - start)
+            return response
+        finally:
+            self.slots.release()
@@ -1,45 +1,725 @@
-from fastapi import FastAPI, HTTPException
+import os
+import json
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager, AsyncExitStack
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from prometheus_client import CONTENT_TYPE_LATEST
 import uvicorn
-from agents import app_graph  # Importamos el grafo compilado
+import agents
+from agents import (  # Importamos el grafo compilado
+    app_graph, AGENT_ORDER, AGENTS_CONFIG, query_embedding_cache,
+    run_in_pool, encode_queries, normalize_query, merge_logs, node_timing_observers, detect_time_range
+)
+from llm_client import request_deadline
+from response_cache import ResponseCache
+from result_store import ResultStore, question_hash
+from single_flight import SingleFlight
+from metrics import (
+    request_id, node_timings, observe_node, register_cache_collector, render_metrics, MULTIPROC_DIR,
+    REQUEST_SECONDS, REQUEST_ERRORS, REQUESTS_IN_FLIGHT, REQUESTS_QUEUED, COALESCED_REQUESTS
+)
+
+# --- CACHE DE RESPUESTAS ---
+# Coincidencia exacta por pregunta normalizada y, si no, semantica por embeddings.
+# RESPONSE_CACHE_FILE activa la persistencia en disco (vacio = solo memoria).
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "500")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "86400")),
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+    persist_path=os.getenv("RESPONSE_CACHE_FILE") or None
+)
+
+# --- ALMACEN DE RESULTADOS ---
+# Todas las respuestas del grafo se guardan en un registro append-only (ver
+# result_store.py) y se pueden pedir por ID en GET /result/{id}. Se abre en el
+# lifespan, despues del fork de gunicorn, porque tiene su propio hilo escritor.
+# RESULT_STORE_DIR vacio lo desactiva.
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", "result_store")
+RESULT_STORE_MAX_FILE_MB = float(os.getenv("RESULT_STORE_MAX_FILE_MB", "64"))
+RESULT_STORE_MAX_FILES = int(os.getenv("RESULT_STORE_MAX_FILES", "20"))
+# Respuestas recientes del almacen que se cargan al cache al arrancar (0 = ninguna)
+RESULT_PREWARM_LIMIT = int(os.getenv("RESULT_PREWARM_LIMIT", "200"))
+
+result_store = None
+
+# Tiempo maximo de una peticion de /ask y /ask/stream para las llamadas al LLM
+# (ver llm_client.py). Debe quedar por debajo del LOGIC_READ_TIMEOUT (60s) de la
+# capa de presentacion, que si no sirve la respuesta degradada mientras aqui se
+# sigue gastando cuota. 0 = sin limite por peticion.
+ASK_DEADLINE = float(os.getenv("ASK_DEADLINE", "50"))
+
+# Cada cuantos segundos se revisa si la coleccion cambio para refrescar el
+# indice local (0 = solo bajo demanda con POST /index/refresh).
+INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "0"))
+
+# Con gunicorn --preload (ver gunicorn.conf.py) el modelo se carga en el proceso
+# maestro antes del fork y los workers comparten sus paginas de memoria.
+if os.getenv("PRELOAD_MODELS") == "1":
+    agents.get_embedding_model()
+
+# Con varios workers (PROMETHEUS_MULTIPROC_DIR) cada uno publica sus contadores
+# de cache cada tanto, asi el scrape que atiende otro worker los incluye.
+CACHE_STATS_PUBLISH_INTERVAL = float(os.getenv("CACHE_STATS_PUBLISH_INTERVAL", "15"))
+
+async def periodic_cache_stats_publish():
+    while True:
+        await asyncio.sleep(CACHE_STATS_PUBLISH_INTERVAL)
+        try:
+            await run_in_pool(cache_collector.publish)
+        except Exception as e:
+            print(f"⚠️ No se pudieron publicar las métricas de cache: {e}")
+
+async def periodic_index_refresh():
+    while True:
+        await asyncio.sleep(INDEX_REFRESH_INTERVAL)
+        if agents.local_index is None:
+            continue
+        try:
+            reloaded = await run_in_pool(agents.local_index.refresh)
+            if reloaded:
+                print(f"🔄 Índice local refrescado: {reloaded}")
+        except Exception as e:
+            print(f"⚠️ Falló el refresco del índice local: {e}")
+
+async def warm_up():
+    try:
+        await run_in_pool(agents.warm_up)
+    except Exception as e:
+        print(f"❌ Falló el warm-up: {e}")
+        return
+    try:
+        await run_in_pool(prewarm_response_cache)
+    except Exception as e:
+        print(f"⚠️ No se pudo precargar el cache desde el almacén de resultados: {e}")
+
+def prewarm_response_cache():
+    """
+    Carga al cache de respuestas las ultimas respuestas completas (todos los
+    personajes, sin errores y aun vigentes) del almacen de resultados.
+    """
+    if result_store is None or RESULT_PREWARM_LIMIT <= 0:
+        return
+    cutoff = time.time() - response_cache.ttl_seconds if response_cache.ttl_seconds else 0
+    records = [
+        record for record in result_store.latest(RESULT_PREWARM_LIMIT)
+        if not record.get("personas") and record["created_at"] >= cutoff and not has_errors(record)
+    ]
+    if not records:
+        return
+    embeddings = encode_queries([record["question"] for record in records])
+    # De la mas vieja a la mas nueva, para que el LRU conserve las recientes
+    for record, embedding in reversed(list(zip(records, embeddings))):
+        result = {"synthesis": record["synthesis"], "logs": record["logs"], "result_id": record["id"]}
+        key, time_range = response_cache_key(record["question"])
+        response_cache.put(key, record["question"], embedding, result,
+                           created_at=record["created_at"], scope=time_range)
+    print(f"♻️  Cache de respuestas precargado con {len(records)} respuestas del almacén.")
+
+@asynccontextmanager
+async def lifespan(app):
+    global result_store
+    if RESULT_STORE_DIR:
+        result_store = ResultStore(RESULT_STORE_DIR, max_file_bytes=int(RESULT_STORE_MAX_FILE_MB * 1024 * 1024),
+                                   max_files=RESULT_STORE_MAX_FILES)
+    # El warm-up corre en segundo plano: /health responde de inmediato y /ready
+    # solo pasa a 200 cuando el modelo ya codifico su primera frase.
+    warm_up_task = asyncio.create_task(warm_up())
+    refresher = None
+    if agents.RETRIEVAL_BACKEND == "local" and INDEX_REFRESH_INTERVAL > 0:
+        refresher = asyncio.create_task(periodic_index_refresh())
+    publisher = asyncio.create_task(periodic_cache_stats_publish()) if MULTIPROC_DIR else None
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        if refresher:
+            refresher.cancel()
+        if publisher:
+            publisher.cancel()
+        try:
+            # Al apagar guardamos el cache para no perderlo entre reinicios
+            response_cache.save()
+        finally:
+            # El almacen se cierra siempre: vacia la cola de escritura pendiente
+            if result_store is not None:
+                result_store.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# --- OBSERVABILIDAD ---
+# Las peticiones mas lentas que este umbral se registran con su request ID.
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "15"))
+
+node_timing_observers.append(observe_node)
+
+def record_node_timing(node, seconds):
+    timings = node_timings.get()
+    if timings is not None:
+        timings[node] = round(seconds, 4)
+
+node_timing_observers.append(record_node_timing)
+cache_collector = register_cache_collector({
+    "query_embeddings": query_embedding_cache.stats,
+    "responses": response_cache.stats
+})
+
+def endpoint_label(request):
+    """
+    Etiqueta de endpoint para las metricas: la plantilla de la ruta
+    ("/result/{result_id}") y no la URL real, para que los IDs y las rutas
+    inexistentes no creen series nuevas sin limite.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "other"
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Propaga el X-Request-ID (o genera uno) y mide la duracion de cada peticion."""
+    rid = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+    request_id.set(rid)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        REQUEST_ERRORS.labels(endpoint=endpoint_label(request), status="500").inc()
+        raise
+
+    elapsed = time.perf_counter() - start
+    endpoint = endpoint_label(request)
+    if endpoint != "/metrics":
+        REQUEST_SECONDS.labels(endpoint=endpoint).observe(elapsed)
+    if response.status_code >= 400:
+        REQUEST_ERRORS.labels(endpoint=endpoint, status=str(response.status_code)).inc()
+    if elapsed > SLOW_REQUEST_SECONDS:
+        print(f"🐢 [{rid}] Petición lenta: {request.url.path} tardó {elapsed:.1f}s")
+    response.headers["X-Request-ID"] = rid
+    return response
+
+@app.get("/health")
+async def health():
+    """Liveness: el proceso responde."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def readiness():
+    """Readiness: solo 200 cuando el warm-up termino (modelo cargado y probado)."""
+    if not agents.ready:
+        return Response(json.dumps({"status": "warming_up"}), status_code=503, media_type="application/json")
+    return {"status": "ready", "chroma": agents.collection is not None}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Metricas en formato Prometheus."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+def response_cache_key(question):
+    """
+    Clave del cache y periodo de la pregunta. El periodo entra en la clave y en
+    la busqueda semantica: la respuesta de abril no sirve para mayo.
+    """
+    time_range = detect_time_range(question)
+    key = normalize_query(question)
+    if time_range is not None:
+        key = f"{key}\x1f{time_range[0]}-{time_range[1]}"
+    return key, time_range
+
+async def lookup_cached_response(question):
+    """Devuelve (resultado, tipo_de_acierto) o (None, None) si no hay respuesta reutilizable."""
+    key, time_range = response_cache_key(question)
+    result = response_cache.get_exact(key)
+    if result is not None:
+        return result, "exact"
+    embedding = (await run_in_pool(encode_queries, [question]))[0]
+    match = await run_in_pool(response_cache.get_semantic, embedding, time_range)
+    if match is not None:
+        return match[0], "semantic"
+    return None, None
+
+def has_errors(result):
+    """Una respuesta con agentes o sintesis fallidos no se cachea: se vuelve a intentar la proxima vez."""
+    return result["synthesis"].startswith("[ERROR") or any(
+        log["thought"].startswith("[ERROR") for log in result["logs"]
+    )
+
+async def store_response(question, result, personas=None):
+    # Solo se cachean las respuestas con todos los personajes: son las que
+    # busca lookup_cached_response
+    if personas or has_errors(result):
+        return
+    # El embedding de la pregunta ya quedo en el cache de embeddings durante la busqueda
+    embedding = (await run_in_pool(encode_queries, [question]))[0]
+    key, time_range = response_cache_key(question)
+    await run_in_pool(response_cache.put, key, question, embedding, result, None, time_range)
+
+def record_result(question, personas, result, seconds, timings):
+    """
+    Encola la respuesta en el almacen de resultados (sin esperar al disco) y le
+    agrega su `result_id`, que viaja tambien en las copias del cache.
+    """
+    if result_store is None:
+        return
+    result_id = result_store.record(question_hash(normalize_query(question), personas), {
+        "question": question,
+        "personas": personas,
+        "request_id": request_id.get(),
+        "synthesis": result["synthesis"],
+        "logs": result["logs"],
+        "timings": {"total": round(seconds, 4), "nodes": timings}
+    })
+    if result_id:
+        result["result_id"] = result_id
+
+# --- CONTROL DE CONCURRENCIA ---
+# Numero maximo de preguntas ejecutandose a la vez en este worker. Las que
+# lleguen por encima de ese limite esperan en cola hasta QUEUE_TIMEOUT segundos;
+# si la cola esta llena o se agota la espera se responde 429 (backpressure).
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "32"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "64"))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "10"))
+
+request_slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+queued_requests = 0
+
+@asynccontextmanager
+async def concurrency_slot():
+    """Reserva un cupo de ejecucion o lanza 429 si el worker esta saturado."""
+    global queued_requests
+    if request_slots.locked() and queued_requests >= MAX_QUEUED_REQUESTS:
+        raise HTTPException(status_code=429, detail="Servidor saturado, intenta de nuevo.",
+                            headers={"Retry-After": str(int(QUEUE_TIMEOUT))})
+
+    queued_requests += 1
+    REQUESTS_QUEUED.inc()
+    try:
+        await asyncio.wait_for(request_slots.acquire(), timeout=QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=429, detail="Tiempo de espera en cola agotado.",
+                            headers={"Retry-After": str(int(QUEUE_TIMEOUT))})
+    finally:
+        queued_requests -= 1
+        REQUESTS_QUEUED.dec()
+
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        request_slots.release()
 
 class QueryRequest(BaseModel):
     question: str
+    bypass_cache: bool = False  # True fuerza una ejecucion nueva del grafo
+    personas: Optional[List[str]] = None  # subconjunto de personajes (None = todos)
+
+def resolve_personas(requested):
+    """
+    Valida la seleccion de personajes y la deja en el orden canonico. Devuelve
+    None si se piden todos, asi la peticion comparte cache y ejecucion con las
+    que no eligen personajes.
+    """
+    if not requested:
+        return None
+    unknown = sorted(set(requested) - set(AGENT_ORDER))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Personajes desconocidos: {unknown}. Disponibles: {AGENT_ORDER}")
+    chosen = [name for name in AGENT_ORDER if name in requested]
+    return None if chosen == AGENT_ORDER else chosen
+
+@app.get("/personas")
+async def list_personas():
+    """Personajes disponibles para el campo `personas` de /ask y /ask/stream."""
+    return [
+        {"name": name, "role": cfg["role"], "source_filter": cfg["source_filter"], "k": cfg["k"]}
+        for name, cfg in AGENTS_CONFIG.items()
+    ]
+
+# --- SINGLE-FLIGHT ---
+# Si llegan varias peticiones con la misma pregunta mientras una ya se esta
+# ejecutando (una pregunta viral en clase), todas se unen a esa unica ejecucion
+# del grafo y reciben su resultado o su stream.
+flights = SingleFlight()
+
+def flight_key(request: QueryRequest):
+    """
+    Clave de deduplicacion: todo lo que cambia la respuesta. bypass_cache no
+    entra: una ejecucion en curso ya es una respuesta nueva.
+    """
+    return (normalize_query(request.question), tuple(request.personas or ()))
+
+def new_initial_state(question, personas=None):
+    return {
+        "question": question,
+        "personas": personas or [],
+        "analysis_logs": [],
+        "final_synthesis": ""
+    }
+
+def set_request_deadline():
+    # El plazo corre desde que llega la peticion, incluida la espera por un cupo
+    if ASK_DEADLINE > 0:
+        request_deadline.set(time.monotonic() + ASK_DEADLINE)
+
+async def run_graph(flight, question, personas):
+    set_request_deadline()
+    async with concurrency_slot():
+        flight.mark_started()
+        timings = {}
+        node_timings.set(timings)
+        start = time.perf_counter()
+        # ainvoke devuelve el estado final después de pasar por todos los nodos
+        final_state = await app_graph.ainvoke(new_initial_state(question, personas))
 
-@app.post("/ask")
-async def ask_agent(request: QueryRequest):
-    print(f"\n📨 SOLICITUD ENTRANTE: {request.question}")
-    
-    try:
-        # Estado inicial
-        initial_state = {
-            "question": request.question,
-            "analysis_logs": [],
-            "final_synthesis": ""
-        }
-        
-        # Ejecutamos el grafo
-        # invoke devuelve el estado final después de pasar por todos los nodos
-        final_state = app_graph.invoke(initial_state)
-        
         # Extraemos resultados del estado final
         synthesis = final_state.get("final_synthesis", "Error generando síntesis.")
         logs = final_state.get("analysis_logs", [])
-        
-        print(f"✅ Proceso completado. Logs generados: {len(logs)}")
-        
-        return {
+
+        print(f"✅ [{request_id.get()}] Proceso completado. Logs generados: {len(logs)}")
+
+        result = {
             "synthesis": synthesis,
             "logs": logs
         }
-        
+        record_result(question, personas, result, time.perf_counter() - start, timings)
+        await store_response(question, result, personas)
+        return result
+
+async def stream_graph(flight, question, personas):
+    set_request_deadline()
+    async with concurrency_slot():
+        flight.mark_started()
+        timings = {}
+        node_timings.set(timings)
+        start = time.perf_counter()
+        result = {"logs": [], "synthesis": ""}
+        async for event in stream_graph_events(new_initial_state(question, personas), result):
+            flight.events.publish(event)
+        result["logs"] = merge_logs([], result["logs"])
+        record_result(question, personas, result, time.perf_counter() - start, timings)
+        await store_response(question, result, personas)
+        return result
+
+def attach_flight(request: QueryRequest, endpoint, streaming):
+    """Se une a la ejecucion en curso de la misma pregunta o lanza una nueva. Devuelve (flight, es_lider)."""
+    key = flight_key(request)
+    flight = flights.get(key)
+    leader = flight is None
+    if leader:
+        run = stream_graph if streaming else run_graph
+        flight = flights.start(key, lambda f: run(f, request.question, request.personas), streaming=streaming)
+    else:
+        flights.join(flight)
+        COALESCED_REQUESTS.labels(endpoint=endpoint).inc()
+        print(f"🔗 [{request_id.get()}] Pregunta idéntica en curso: se reutiliza su ejecución.")
+    flights.attach(flight)
+    return flight, leader
+
+@app.post("/ask")
+async def ask_agent(request: QueryRequest):
+    print(f"\n📨 [{request_id.get()}] SOLICITUD ENTRANTE: {request.question}")
+    request.personas = resolve_personas(request.personas)
+
+    if not request.bypass_cache and request.personas is None:
+        cached, match_type = await lookup_cached_response(request.question)
+        if cached is not None:
+            print(f"♻️  Respuesta servida desde cache ({match_type}).")
+            return {**cached, "cached": match_type}
+
+    flight, _ = attach_flight(request, "/ask", streaming=False)
+    try:
+        return await flights.wait(flight)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error Crítico en Logic Layer: {e}")
+        print(f"❌ [{request_id.get()}] Error Crítico en Logic Layer: {e}")
         # Es buena práctica imprimir el stacktrace en logs reales
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- LOTES (/ask/batch) ---
+# Pensado para corridas de estudio con cientos de preguntas. Un lote ocupa un
+# solo cupo de concurrencia; dentro del lote corren BATCH_CONCURRENCY preguntas
+# a la vez y las llamadas al LLM respetan el limite global LLM_MAX_CONCURRENCY.
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    bypass_cache: bool = False
+
+def parse_batch_body(body, content_type):
+    """
+    Acepta un JSON {"questions": [...], "bypass_cache": bool} o un archivo JSONL
+    (Content-Type: application/x-ndjson) con una pregunta por linea, ya sea como
+    texto JSON ("...") o como objeto {"question": "..."}.
+    Devuelve (preguntas, bypass_cache o None si el cuerpo no lo indica).
+    """
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            questions = []
+            for line_number, line in enumerate(body.decode("utf-8").splitlines(), start=1):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                question = item.get("question") if isinstance(item, dict) else item
+                if not isinstance(question, str):
+                    raise ValueError(f"línea {line_number}: falta el campo 'question'")
+                questions.append(question)
+            return questions, None
+        batch = BatchRequest(**json.loads(body))
+        return batch.questions, batch.bypass_cache
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Lote inválido: {e}")
+
+async def run_batch_item(index, question, prepared, semaphore):
+    """Ejecuta una pregunta del lote; los errores se devuelven en el item, no se propagan."""
+    request_id.set(f"{request_id.get()}-{index}")
+    async with semaphore:
+        try:
+            timings = {}
+            node_timings.set(timings)
+            start = time.perf_counter()
+            initial_state = {
+                "question": question,
+                "analysis_logs": [],
+                "final_synthesis": "",
+                **prepared
+            }
+            final_state = await app_graph.ainvoke(initial_state)
+            result = {
+                "synthesis": final_state.get("final_synthesis", "Error generando síntesis."),
+                "logs": final_state.get("analysis_logs", [])
+            }
+            record_result(question, None, result, time.perf_counter() - start, timings)
+            await store_response(question, result)
+            return {"index": index, "question": question, "status": "ok", **result}
+        except Exception as e:
+            print(f"❌ [{request_id.get()}] Error en pregunta del lote: {e}")
+            return {"index": index, "question": question, "status": "error", "error": str(e)}
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que ejecuta `release` al terminar de responder, tambien si
+    el cliente se desconecto antes de que se empezara a recorrer el cuerpo (en
+    ese caso el generador nunca corre y no puede liberar nada por su cuenta).
+    """
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.release()
+
+@app.post("/ask/batch")
+async def ask_batch(request: Request, bypass_cache: bool = False):
+    """
+    Ejecuta un lote de preguntas y devuelve JSONL a medida que cada una termina
+    (no en el orden de entrada: cada linea lleva su `index`). Al final se emite
+    una linea {"summary": ...} con el conteo de aciertos, errores y cache.
+    """
+    questions, body_bypass = parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    bypass_cache = bypass_cache or bool(body_bypass)
+    if not questions:
+        raise HTTPException(status_code=400, detail="El lote no contiene preguntas.")
+    if len(questions) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_BATCH_SIZE} preguntas por lote.")
+
+    print(f"\n📦 [{request_id.get()}] LOTE ENTRANTE: {len(questions)} preguntas")
+
+    # El cupo se libera al cerrar `stack`: al terminar el generador o, si nunca
+    # llega a correr, en ReleasingStreamingResponse
+    stack = AsyncExitStack()
+    await stack.enter_async_context(concurrency_slot())
+
+    def jsonl(item):
+        return json.dumps(item, ensure_ascii=False) + "\n"
+
+    async def results_stream():
+        async with stack:
+            start = time.perf_counter()
+            counts = {"ok": 0, "error": 0, "cached": 0}
+            pending = []
+
+            # 1. Cache: las preguntas se codifican todas juntas y el lookup
+            #    reutiliza esos embeddings desde el cache de consultas.
+            if bypass_cache:
+                pending = list(range(len(questions)))
+            else:
+                await run_in_pool(encode_queries, questions)
+                for index, question in enumerate(questions):
+                    cached, match_type = await lookup_cached_response(question)
+                    if cached is None:
+                        pending.append(index)
+                        continue
+                    counts["ok"] += 1
+                    counts["cached"] += 1
+                    yield jsonl({"index": index, "question": question, "status": "ok",
+                                 **cached, "cached": match_type})
+
+            # 2. Recuperacion del lote completo (un batch de embeddings y una
+            #    consulta a Chroma por agente). Si falla, cada pregunta hace la suya.
+            try:
+                prepared = await run_in_pool(agents.prepare_batch, [questions[i] for i in pending])
+            except Exception as e:
+                print(f"⚠️ [{request_id.get()}] Falló la recuperación por lotes ({e}); se hará por pregunta.")
+                prepared = [{} for _ in pending]
+
+            # 3. Grafo por pregunta, emitiendo cada resultado en cuanto termina
+            semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+            tasks = [
+                asyncio.create_task(run_batch_item(index, questions[index], item, semaphore))
+                for index, item in zip(pending, prepared)
+            ]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    item = await next_done
+                    counts[item["status"]] += 1
+                    yield jsonl(item)
+            finally:
+                # Si el cliente se desconecta no seguimos gastando llamadas al LLM
+                for task in tasks:
+                    task.cancel()
+
+            elapsed = time.perf_counter() - start
+            print(f"✅ [{request_id.get()}] Lote completado en {elapsed:.1f}s: {counts}")
+            yield jsonl({"summary": {"total": len(questions), **counts, "seconds": round(elapsed, 2)}})
+
+    return ReleasingStreamingResponse(results_stream(), release=stack.aclose, media_type="application/x-ndjson")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Contadores de aciertos/fallos de los caches del Logic Layer."""
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "responses": response_cache.stats(),
+        "single_flight": flights.stats(),
+        "result_store": result_store.stats() if result_store is not None else None
+    }
+
+@app.get("/result/{result_id}")
+async def get_result(result_id: str):
+    """Respuesta guardada por su `result_id` (o la ultima de una pregunta, por su hash)."""
+    if result_store is None:
+        raise HTTPException(status_code=409, detail="El almacén de resultados no está activo.")
+    record = await run_in_pool(result_store.get, result_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Resultado no encontrado.")
+    return record
+
+@app.post("/index/refresh")
+async def refresh_index(force: bool = False):
+    """Hook para resincronizar el indice local cuando cambia la coleccion en Chroma."""
+    if agents.local_index is None:
+        raise HTTPException(status_code=409, detail="El backend de recuperación local no está activo.")
+    reloaded = await run_in_pool(agents.local_index.refresh, force)
+    return {"reloaded": reloaded, "partitions": agents.local_index.stats()}
+
+# --- STREAMING (SSE) ---
+# Nombre con el que el frontend conoce al nodo sintetizador.
+SYNTHESIZER_AGENT_NAME = "The Historian"
+
+def sse_event(event, data):
+    """Serializa un evento en formato Server-Sent-Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_graph_events(initial_state, result):
+    """
+    Recorre el grafo emitiendo eventos a medida que ocurren:
+    - token: fragmento de texto del LLM de un agente (si el modelo hace streaming)
+    - agent: log completo de un agente en cuanto su nodo termina
+    - synthesis: texto final del Synthesizer
+    Ademas va armando en `result` la respuesta completa para poder cachearla.
+    """
+    async for mode, chunk in app_graph.astream(initial_state, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            text = message.content if isinstance(message.content, str) else ""
+            if text and (node in AGENT_ORDER or node == "Synthesizer"):
+                agent = SYNTHESIZER_AGENT_NAME if node == "Synthesizer" else node
+                yield sse_event("token", {"agent": agent, "text": text})
+            continue
+
+        for node, update in chunk.items():
+            if not update:
+                continue
+            for log in update.get("analysis_logs", []):
+                result["logs"].append(log)
+                yield sse_event("agent", log)
+            if "final_synthesis" in update:
+                result["synthesis"] = update["final_synthesis"]
+                yield sse_event("synthesis", {"synthesis": update["final_synthesis"]})
+
+def result_events(result):
+    """Eventos agent/synthesis de una respuesta ya completa."""
+    for log in result["logs"]:
+        yield sse_event("agent", log)
+    yield sse_event("synthesis", {"synthesis": result["synthesis"]})
+
+def cached_events(result):
+    """Reproduce una respuesta cacheada con los mismos eventos que el stream real."""
+    yield from result_events(result)
+    yield sse_event("done", {"cached": True, "result_id": result.get("result_id")})
+
+@app.post("/ask/stream")
+async def ask_agent_stream(request: QueryRequest):
+    print(f"\n📡 [{request_id.get()}] SOLICITUD STREAMING: {request.question}")
+    request.personas = resolve_personas(request.personas)
+
+    if not request.bypass_cache and request.personas is None:
+        cached, match_type = await lookup_cached_response(request.question)
+        if cached is not None:
+            print(f"♻️  Stream servido desde cache ({match_type}).")
+            return StreamingResponse(
+                cached_events(cached),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+    # Se espera a que la ejecucion tenga cupo antes de abrir el stream para poder
+    # responder 429 con un status real.
+    flight, leader = attach_flight(request, "/ask/stream", streaming=True)
+    try:
+        await asyncio.shield(flight.started)
+    except BaseException:
+        flights.detach(flight)
+        raise
+
+    async def event_stream():
+        try:
+            if flight.events is not None:
+                # Historial de la ejecucion compartida + eventos en vivo
+                async for event in flight.events.subscribe():
+                    yield event
+                result = await asyncio.shield(flight.result)
+            else:
+                # Unido a una ejecucion de /ask (sin tokens): se emite el resultado al terminar
+                result = await asyncio.shield(flight.result)
+                for event in result_events(result):
+                    yield event
+            done = {"result_id": result.get("result_id")}
+            yield sse_event("done", done if leader else {**done, "coalesced": True})
+            print(f"✅ [{request_id.get()}] Stream completado.")
+        except Exception as e:
+            REQUEST_ERRORS.labels(endpoint="/ask/stream", status="stream").inc()
+            print(f"❌ [{request_id.get()}] Error en stream: {e}")
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            flights.detach(flight)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     # Corremos en 0.0.0.0 para que sea accesible desde otros contenedores
-    uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=5000)
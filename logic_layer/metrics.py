@@ -0,0 +1,180 @@
+import os
+import glob
+import json
+import time
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, REGISTRY
+
+# Instrumentacion del camino caliente de la capa logica. Todas las metricas se
+# exponen en formato Prometheus en GET /metrics (ver main.py).
+#
+# El registro de prometheus_client es por proceso. Con gunicorn hay varios
+# workers, asi que gunicorn.conf.py fija PROMETHEUS_MULTIPROC_DIR: cada worker
+# escribe sus series en esa carpeta y /metrics devuelve la suma de todos
+# (modo multiproceso de prometheus_client). Sin esa variable se usa el
+# registro normal del proceso.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+# ID de la peticion en curso. Lo genera (o propaga) la capa de presentacion en
+# la cabecera X-Request-ID para poder seguir una peticion lenta en ambos servicios.
+request_id = contextvars.ContextVar("request_id", default="-")
+# Agente que esta ejecutando la etapa actual (se usa como etiqueta por defecto).
+current_agent = contextvars.ContextVar("current_agent", default="-")
+# Duracion de cada nodo en la ejecucion actual ({nodo: segundos}); la llena
+# main.py para guardarla junto a la respuesta en el almacen de resultados.
+node_timings = contextvars.ContextVar("node_timings", default=None)
+
+# Buckets pensados para etapas que van de milisegundos (cache, regex) a decenas
+# de segundos (llamadas al LLM).
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "anima_stage_duration_seconds",
+    "Duración de cada etapa del pipeline por agente",
+    ["stage", "agent"],
+    buckets=STAGE_BUCKETS
+)
+NODE_SECONDS = Histogram(
+    "anima_node_duration_seconds",
+    "Duración de cada nodo del grafo LangGraph",
+    ["node"],
+    buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "anima_request_duration_seconds",
+    "Duración total de las peticiones HTTP",
+    ["endpoint"],
+    buckets=STAGE_BUCKETS
+)
+PROMPT_TOKENS = Histogram(
+    "anima_prompt_tokens",
+    "Tokens de entrada por llamada al LLM",
+    ["agent"],
+    buckets=(64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 4096)
+)
+REQUESTS_IN_FLIGHT = Gauge("anima_requests_in_flight", "Preguntas ejecutándose en el grafo",
+                           multiprocess_mode="livesum")
+REQUESTS_QUEUED = Gauge("anima_requests_queued", "Preguntas esperando un cupo de ejecución",
+                        multiprocess_mode="livesum")
+REQUEST_ERRORS = Counter("anima_request_errors_total", "Peticiones que terminaron en error", ["endpoint", "status"])
+AGENT_ERRORS = Counter("anima_agent_errors_total", "Errores de procesamiento por agente", ["agent"])
+LLM_RETRIES = Counter("anima_llm_retries_total", "Reintentos de llamadas al LLM por tipo de error", ["reason"])
+LLM_HEDGES = Counter("anima_llm_hedged_requests_total",
+                     "Llamadas duplicadas por superar el p95 y cual respondio primero", ["winner"])
+LLM_FALLBACKS = Counter("anima_llm_fallbacks_total", "Llamadas resueltas con el modelo de respaldo")
+COALESCED_REQUESTS = Counter("anima_coalesced_requests_total",
+                             "Peticiones que se unieron a una ejecución idéntica en curso (ejecuciones ahorradas)",
+                             ["endpoint"])
+
+@contextmanager
+def stage_timer(stage, agent=None):
+    """Mide un bloque de codigo (sincrono o asincrono) y lo registra en el histograma."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        label = agent or current_agent.get()
+        STAGE_SECONDS.labels(stage=stage, agent=label).observe(time.perf_counter() - start)
+
+def observe_node(node, seconds):
+    NODE_SECONDS.labels(node=node).observe(seconds)
+
+class CacheStatsCollector:
+    """
+    Publica los contadores de los caches en cada scrape. `sources` es un dict
+    nombre -> funcion que devuelve el stats() del cache (o None si esta apagado).
+    En modo multiproceso cada worker deja sus contadores en un json de la carpeta
+    compartida (publish) y el scrape suma los de todos los workers vivos.
+    """
+    def __init__(self, sources):
+        self.sources = sources
+
+    def local_stats(self):
+        totals = {}
+        for name, get_stats in self.sources.items():
+            stats = get_stats()
+            if not stats:
+                continue
+            totals[name] = {
+                "hits": stats.get("hits", stats.get("exact_hits", 0) + stats.get("semantic_hits", 0)),
+                "misses": stats.get("misses", 0),
+                "entries": stats.get("entries", 0)
+            }
+        return totals
+
+    def publish(self):
+        if not MULTIPROC_DIR:
+            return
+        path = cache_stats_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.local_stats(), f)
+        os.replace(tmp_path, path)
+
+    def current_stats(self):
+        if not MULTIPROC_DIR:
+            return self.local_stats()
+        self.publish()
+        totals = {}
+        for path in glob.glob(cache_stats_path("*")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    worker_stats = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, stats in worker_stats.items():
+                total = totals.setdefault(name, {"hits": 0, "misses": 0, "entries": 0})
+                for field in total:
+                    total[field] += stats.get(field, 0)
+        return totals
+
+    def families(self):
+        return (
+            CounterMetricFamily("anima_cache_hits", "Aciertos por cache", labels=["cache"]),
+            CounterMetricFamily("anima_cache_misses", "Fallos por cache", labels=["cache"]),
+            GaugeMetricFamily("anima_cache_hit_rate", "Tasa de aciertos por cache", labels=["cache"]),
+            GaugeMetricFamily("anima_cache_entries", "Entradas guardadas por cache", labels=["cache"])
+        )
+
+    def describe(self):
+        # Sin describe() el registro llamaria a collect() al registrar (en el
+        # proceso maestro de gunicorn, que no atiende peticiones)
+        return self.families()
+
+    def collect(self):
+        hits, misses, hit_rate, entries = self.families()
+        for name, stats in self.current_stats().items():
+            total = stats["hits"] + stats["misses"]
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            hit_rate.add_metric([name], stats["hits"] / total if total else 0.0)
+            entries.add_metric([name], stats["entries"])
+
+        yield hits
+        yield misses
+        yield hit_rate
+        yield entries
+
+def cache_stats_path(pid):
+    return os.path.join(MULTIPROC_DIR, f"cache_stats_{pid}.json")
+
+cache_collector = None
+
+def register_cache_collector(sources):
+    global cache_collector
+    cache_collector = CacheStatsCollector(sources)
+    REGISTRY.register(cache_collector)
+    return cache_collector
+
+def render_metrics():
+    """Texto para GET /metrics: el registro del proceso o, con gunicorn, la suma de los workers."""
+    if not MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    if cache_collector is not None:
+        registry.register(cache_collector)
+    return generate_latest(registry)
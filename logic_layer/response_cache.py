@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Cache de respuestas completas de /ask. Primero se busca la pregunta exacta
+# (normalizada); si no aparece, se compara su embedding contra las preguntas ya
+# respondidas y se reutiliza la respuesta si la similitud coseno supera el umbral.
+# Cada entrada lleva un `scope` (el periodo que detecta agents.detect_time_range):
+# una coincidencia semantica solo vale con el mismo scope, porque "¿qué pasó en
+# abril?" y "¿qué pasó en mayo?" son casi identicas para el modelo de embeddings.
+# Opcionalmente se guarda en disco para sobrevivir a reinicios del contenedor.
+
+class ResponseCache:
+    def __init__(self, max_entries=500, ttl_seconds=86400, similarity_threshold=0.95,
+                 persist_path=None, persist_interval=30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.persist_path = persist_path
+        self.persist_interval = persist_interval
+
+        # clave normalizada -> {"question", "embedding", "scope", "result", "created_at"}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._matrix = None  # embeddings apilados para la busqueda semantica
+        self._matrix_keys = []
+        self._matrix_scopes = []
+        self._last_save = 0.0
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        if self.persist_path:
+            self.load()
+
+    # --- BUSQUEDA ---
+
+    def get_exact(self, key):
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry["result"]
+
+    def get_semantic(self, embedding, scope=None):
+        """Devuelve (resultado, similitud) de la pregunta mas parecida con el mismo scope o None."""
+        with self._lock:
+            self._purge_expired()
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries.keys())
+                self._matrix_scopes = [self._entries[k]["scope"] for k in self._matrix_keys]
+                self._matrix = np.stack([self._entries[k]["embedding"] for k in self._matrix_keys])
+
+            query = _normalize(np.asarray(embedding, dtype=np.float32))
+            scores = self._matrix @ query
+            scores[[entry_scope != scope for entry_scope in self._matrix_scopes]] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            key = self._matrix_keys[best]
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return self._entries[key]["result"], float(scores[best])
+
+    # --- ESCRITURA ---
+
+    def put(self, key, question, embedding, result, created_at=None, scope=None):
+        with self._lock:
+            self._entries[key] = {
+                "question": question,
+                "embedding": _normalize(np.asarray(embedding, dtype=np.float32)),
+                "scope": scope,
+                "result": result,
+                "created_at": created_at or time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+            should_save = self.persist_path and time.time() - self._last_save > self.persist_interval
+        if should_save:
+            self.save()
+
+    # --- PERSISTENCIA ---
+
+    def save(self):
+        if not self.persist_path:
+            return
+        with self._lock:
+            payload = [
+                {
+                    "key": key,
+                    "question": entry["question"],
+                    "embedding": entry["embedding"].tolist(),
+                    "scope": entry["scope"],
+                    "result": entry["result"],
+                    "created_at": entry["created_at"]
+                }
+                for key, entry in self._entries.items()
+            ]
+            self._last_save = time.time()
+        # Escritura atomica: si el proceso muere a mitad, el archivo anterior sigue intacto.
+        # El temporal lleva el pid: cada worker guarda el mismo archivo y no deben pisarse.
+        tmp_path = f"{self.persist_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el cache de respuestas ({e}).")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ No se pudo leer el cache de respuestas ({e}). Se empieza vacío.")
+            return
+        with self._lock:
+            for item in payload[-self.max_entries:]:
+                if "scope" not in item:
+                    continue  # Formato anterior, sin periodo: no se puede comparar con seguridad
+                scope = item["scope"]
+                self._entries[item["key"]] = {
+                    "question": item["question"],
+                    "embedding": np.asarray(item["embedding"], dtype=np.float32),
+                    "scope": tuple(scope) if scope is not None else None,
+                    "result": item["result"],
+                    "created_at": item["created_at"]
+                }
+            self._purge_expired()
+            self._matrix = None
+        print(f"💾 Cache de respuestas cargado: {len(self._entries)} entradas.")
+
+    # --- UTILIDADES ---
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and self._is_expired(entry):
+            del self._entries[key]
+            self._matrix = None
+            return None
+        return entry
+
+    def _is_expired(self, entry):
+        return bool(self.ttl_seconds) and time.time() - entry["created_at"] > self.ttl_seconds
+
+    def _purge_expired(self):
+        expired = [k for k, entry in self._entries.items() if self._is_expired(entry)]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def stats(self):
+        total = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0
+        }
+
+def _normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import hashlib
+import threading
+
+# Registro append-only de las respuestas del grafo (pregunta, pensamientos de
+# cada agente, contexto usado, sintesis y tiempos por nodo) para analizarlas
+# despues, servirlas por ID en GET /result/{id} y precargar el cache de
+# respuestas al arrancar.
+#
+# record() solo encola y vuelve de inmediato; un hilo escritor serializa los
+# registros a JSONL en lotes. Cada proceso escribe su propia serie de archivos
+# (con gunicorn hay varios workers sobre la misma carpeta) que rota por tamaño:
+#   results-<inicio>-<pid>-<escritor>-0001.jsonl, ...-0002.jsonl, ...
+# Al rotar se borran los archivos mas viejos de la carpeta hasta dejar
+# max_files, salvo el ultimo de cada serie cuyo proceso sigue vivo: ese es el
+# archivo en el que otro worker esta escribiendo.
+#
+# El indice (id -> archivo, offset, largo y hash de pregunta -> ultima
+# respuesta) vive en memoria. Se arma recorriendo los archivos al abrir y se
+# actualiza leyendo solo los bytes nuevos, asi un worker encuentra tambien las
+# respuestas que escribieron los otros.
+
+FILE_RE = re.compile(r"^results-[\w-]+\.jsonl$")
+
+def question_hash(normalized_question, personas=None):
+    """Hash estable de una pregunta (ya normalizada) y su seleccion de personajes."""
+    key = normalized_question + ("\x1f" + ",".join(personas) if personas else "")
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def writer_alive(name):
+    """
+    True si el proceso que escribe la serie de `name` podria seguir vivo. Ante la
+    duda (pid reutilizado, sin permisos) se asume que si.
+    """
+    parts = name.split("-")
+    if len(parts) != 5 or not parts[2].isdigit():
+        return False  # Nombre sin pid (formato anterior): nadie escribe en el
+    try:
+        os.kill(int(parts[2]), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+class ResultStore:
+    def __init__(self, directory, max_file_bytes=64 * 1024 * 1024, max_files=20, queue_size=10000):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max(max_files, 1)
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._locations = {}  # id -> (archivo, offset, largo)
+        self._latest = {}  # hash de pregunta -> (created_at, id) de la respuesta mas reciente
+        self._pending = {}  # registros encolados que aun no llegan al disco
+        self._scanned = {}  # archivo -> bytes ya indexados
+        self.written = 0
+        self.dropped = 0
+
+        self._prefix = f"results-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._sequence = 1
+        self._current = self._file_name()
+
+        self.refresh()
+        if self._locations:
+            print(f"🗃️  Almacén de resultados: {len(self._locations)} respuestas en {len(self._scanned)} archivos.")
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._write_loop, name="result-store", daemon=True)
+        self._writer.start()
+
+    # --- ESCRITURA ---
+
+    def record(self, question_key, payload):
+        """
+        Encola un registro y devuelve su ID. Nunca bloquea: si la cola esta llena
+        (disco lento o caido) el registro se descarta y se cuenta en `dropped`.
+        """
+        result_id = uuid.uuid4().hex[:16]
+        entry = {"id": result_id, "question_hash": question_key, "created_at": time.time(), **payload}
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            return None
+        with self._lock:
+            self._pending[result_id] = entry
+            self._remember(question_key, entry["created_at"], result_id)
+        return result_id
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Se escribe todo lo acumulado de una vez (un flush por lote)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            batch = [item for item in batch if item is not None]
+            try:
+                if batch:
+                    self._append(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                print(f"⚠️ No se pudieron guardar {len(batch)} resultados: {e}")
+                with self._lock:
+                    for item in batch:
+                        self._pending.pop(item["id"], None)
+            if stop:
+                return
+
+    def _append(self, batch):
+        offset = self._scanned.get(self._current, 0)
+        locations = []
+        handle = open(self._path(self._current), "ab")
+        try:
+            for item in batch:
+                line = (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+                if offset and offset + len(line) > self.max_file_bytes:
+                    handle.close()
+                    self._commit(locations, offset)
+                    locations = []
+                    self._rotate()
+                    handle = open(self._path(self._current), "ab")
+                    offset = 0
+                handle.write(line)
+                locations.append((item["id"], (self._current, offset, len(line))))
+                offset += len(line)
+        finally:
+            handle.close()
+        self._commit(locations, offset)
+
+    def _commit(self, locations, offset):
+        """Publica en el indice los registros ya escritos en el archivo actual."""
+        with self._lock:
+            for result_id, location in locations:
+                self._locations[result_id] = location
+                self._pending.pop(result_id, None)
+            self._scanned[self._current] = offset
+            self.written += len(locations)
+
+    def _rotate(self):
+        """Pasa al siguiente archivo de la serie y borra los mas viejos de la carpeta."""
+        self._sequence += 1
+        self._current = self._file_name()
+        files = self._list_files()
+        newest = {}  # serie -> su ultimo archivo (los numeros llevan ceros a la izquierda)
+        for name in files:
+            series = name.rsplit("-", 1)[0]
+            newest[series] = max(newest.get(series, name), name)
+        candidates = [
+            name for name in files
+            if name != newest[name.rsplit("-", 1)[0]] or not writer_alive(name)
+        ]
+        candidates.sort(key=lambda name: os.path.getmtime(self._path(name)))
+        for name in candidates[:max(len(files) + 1 - self.max_files, 0)]:
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+        with self._lock:
+            self._forget_missing()
+
+    def close(self, timeout=5.0):
+        """Escribe lo que quede en la cola y detiene el hilo escritor."""
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    # --- LECTURA ---
+
+    def get(self, result_id):
+        """Registro por ID de respuesta o, si no existe, ultima respuesta por hash de pregunta."""
+        with self._lock:
+            known_id = result_id in self._locations or result_id in self._pending
+        if not known_id:
+            # Un ID desconocido o un hash de pregunta: otro worker puede haber
+            # escrito esa respuesta (o una mas nueva) desde la ultima lectura
+            self.refresh()
+        location = self._locate(result_id)
+        if isinstance(location, dict):
+            return location
+        return self._read(location) if location else None
+
+    def latest(self, limit):
+        """Las `limit` respuestas mas recientes, una por pregunta (la ultima de cada una)."""
+        self.refresh()
+        with self._lock:
+            newest = sorted(self._latest.values(), reverse=True)[:max(limit, 0)]
+        records = [self.get(result_id) for _, result_id in newest]
+        return [record for record in records if record is not None]
+
+    def _locate(self, result_id):
+        """Ubicacion en disco, el registro pendiente o None."""
+        with self._lock:
+            if result_id not in self._locations and result_id not in self._pending and result_id in self._latest:
+                result_id = self._latest[result_id][1]
+            if result_id in self._pending:
+                return self._pending[result_id]
+            return self._locations.get(result_id)
+
+    def _read(self, location):
+        name, offset, length = location
+        try:
+            with open(self._path(name), "rb") as f:
+                f.seek(offset)
+                return json.loads(f.read(length))
+        except (OSError, ValueError):
+            return None
+
+    # --- INDICE ---
+
+    def refresh(self):
+        """Indexa los bytes nuevos de todos los archivos de la carpeta (propios y de otros procesos)."""
+        for name in self._list_files():
+            if name == self._current:
+                continue  # El archivo propio se indexa al escribir
+            start = self._scanned.get(name, 0)
+            try:
+                if os.path.getsize(self._path(name)) <= start:
+                    continue
+                with open(self._path(name), "rb") as f:
+                    f.seek(start)
+                    data = f.read()
+            except OSError:
+                continue
+            # Solo lineas completas: una linea sin salto final se esta escribiendo
+            # (o quedo cortada por una caida) y se vuelve a mirar en el proximo refresh
+            end = data.rfind(b"\n") + 1
+            entries = []
+            offset = start
+            for line in data[:end].splitlines(keepends=True):
+                try:
+                    item = json.loads(line)
+                    entries.append((item["id"], item["question_hash"], item["created_at"], (name, offset, len(line))))
+                except (ValueError, KeyError):
+                    pass
+                offset += len(line)
+            with self._lock:
+                for result_id, question_key, created_at, location in entries:
+                    self._locations[result_id] = location
+                    self._remember(question_key, created_at, result_id)
+                self._scanned[name] = max(self._scanned.get(name, 0), start + end)
+        with self._lock:
+            self._forget_missing()
+
+    def _remember(self, question_key, created_at, result_id):
+        if question_key not in self._latest or self._latest[question_key][0] <= created_at:
+            self._latest[question_key] = (created_at, result_id)
+
+    def _forget_missing(self):
+        """Quita del indice lo que apuntaba a archivos borrados por la rotacion."""
+        existing = set(self._list_files()) | {self._current}
+        if all(name in existing for name in self._scanned):
+            return
+        self._scanned = {name: size for name, size in self._scanned.items() if name in existing}
+        self._locations = {k: loc for k, loc in self._locations.items() if loc[0] in existing}
+        self._latest = {
+            key: value for key, value in self._latest.items()
+            if value[1] in self._locations or value[1] in self._pending
+        }
+
+    def _file_name(self):
+        return f"{self._prefix}-{self._sequence:04d}.jsonl"
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _list_files(self):
+        try:
+            return [name for name in os.listdir(self.directory) if FILE_RE.match(name)]
+        except OSError:
+            return []
+
+    def stats(self):
+        with self._lock:
+            return {
+                "results": len(self._locations),
+                "questions": len(self._latest),
+                "pending": len(self._pending),
+                "files": len(self._scanned),
+                "written": self.written,
+                "dropped": self.dropped
+            }
@@ -0,0 +1,122 @@
+import asyncio
+
+class Broadcast:
+    """
+    Eventos de una ejecucion compartida. Guarda el historial para que quien se
+    une tarde reciba primero lo que ya paso y luego los eventos en vivo.
+    """
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self._updated = asyncio.Event()
+
+    def publish(self, event):
+        self.events.append(event)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.closed:
+                return
+            await self._updated.wait()
+
+class Flight:
+    """Una ejecucion del grafo en curso, compartida por todas las peticiones con la misma clave."""
+    def __init__(self, key, streaming):
+        loop = asyncio.get_running_loop()
+        self.key = key
+        # `started` se resuelve cuando la ejecucion obtuvo su cupo de concurrencia
+        # (o falla con el 429), asi un stream puede responder el error antes de abrirse.
+        self.started = loop.create_future()
+        self.result = loop.create_future()
+        self.events = Broadcast() if streaming else None
+        self.waiters = 0
+        self.task = None
+        # Evita el aviso "exception was never retrieved" si nadie llega a esperar
+        for future in (self.started, self.result):
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def mark_started(self):
+        if not self.started.done():
+            self.started.set_result(True)
+
+class SingleFlight:
+    """
+    Deduplicacion de ejecuciones concurrentes (single-flight): la primera peticion
+    con una clave lanza la ejecucion en una tarea aparte y las siguientes se unen
+    a ella mientras no haya terminado. Si todas las peticiones unidas se van
+    (clientes desconectados) la ejecucion se cancela para no gastar el LLM.
+    """
+    def __init__(self):
+        self.flights = {}
+        self.started_total = 0
+        self.coalesced_total = 0
+
+    def get(self, key):
+        return self.flights.get(key)
+
+    def start(self, key, run, streaming=False):
+        """Registra y lanza `run(flight)`. Debe llamarse sin awaits desde el get() previo."""
+        flight = Flight(key, streaming)
+        self.flights[key] = flight
+        self.started_total += 1
+        flight.task = asyncio.create_task(self._execute(flight, run))
+        return flight
+
+    def join(self, flight):
+        self.coalesced_total += 1
+
+    async def _execute(self, flight, run):
+        try:
+            flight.result.set_result(await run(flight))
+        except asyncio.CancelledError:
+            flight.result.cancel()
+            raise
+        except Exception as e:
+            flight.result.set_exception(e)
+        finally:
+            if not flight.started.done():
+                if flight.result.cancelled() or flight.result.exception() is None:
+                    flight.started.cancel()
+                else:
+                    flight.started.set_exception(flight.result.exception())
+            if flight.events is not None:
+                flight.events.close()
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+
+    def attach(self, flight):
+        flight.waiters += 1
+
+    def detach(self, flight):
+        flight.waiters -= 1
+        if flight.waiters <= 0 and not flight.task.done():
+            flight.task.cancel()
+
+    async def wait(self, flight):
+        """Espera el resultado compartido (ya contado con attach)."""
+        try:
+            return await asyncio.shield(flight.result)
+        finally:
+            self.detach(flight)
+
+    def stats(self):
+        total = self.started_total + self.coalesced_total
+        return {
+            "in_flight": len(self.flights),
+            "executions": self.started_total,
+            "coalesced": self.coalesced_total,
+            "saved_rate": self.coalesced_total / total if total else 0.0
+        }
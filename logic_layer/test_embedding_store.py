@@ -0,0 +1,55 @@
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+# Pruebas de embedding_store.py: solo se codifican los textos nuevos, los
+# vectores persisten entre aperturas y se recupera tras una escritura cortada.
+# Uso (desde logic_layer/): python -m pytest -q test_embedding_store.py
+
+DIM = 4
+
+class CountingEncoder:
+    def __init__(self, value=1.0):
+        self.value = value
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return np.array([[self.value + i] * DIM for i in range(len(texts))], dtype=np.float32)
+
+def test_only_missing_texts_are_encoded(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "modelo", DIM)
+    encoder = CountingEncoder()
+    first = store.encode(["a", "b"], encoder)
+    second = store.encode(["b", "c", "a"], encoder)
+
+    assert encoder.texts == ["a", "b", "c"]
+    np.testing.assert_array_equal(second[0], first[1])
+    np.testing.assert_array_equal(second[2], first[0])
+    assert store.hits == 2 and store.misses == 3
+
+def test_vectors_survive_reopen(tmp_path):
+    EmbeddingStore(str(tmp_path), "modelo", DIM).encode(["a", "b"], CountingEncoder())
+    reopened = EmbeddingStore(str(tmp_path), "modelo", DIM)
+    encoder = CountingEncoder(value=9.0)
+    vectors = reopened.encode(["b", "a"], encoder)
+
+    assert encoder.texts == []
+    np.testing.assert_array_equal(vectors, [[2.0] * DIM, [1.0] * DIM])
+
+def test_models_do_not_share_vectors(tmp_path):
+    EmbeddingStore(str(tmp_path), "modelo", DIM).encode(["a"], CountingEncoder())
+    other = EmbeddingStore(str(tmp_path), "otro-modelo", DIM)
+    assert other.get_many(["a"]) == [None]
+
+def test_index_rows_past_vectors_are_ignored(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "modelo", DIM)
+    store.encode(["a", "b"], CountingEncoder())
+    # Escritura interrumpida: el indice apunta a una fila que no llego al disco
+    vectors_path = tmp_path / "modelo" / "vectors.f32"
+    vectors_path.write_bytes(vectors_path.read_bytes()[:4 * DIM])
+
+    reopened = EmbeddingStore(str(tmp_path), "modelo", DIM)
+    assert len(reopened) == 1
+    assert reopened.get_many(["b"]) == [None]
+    np.testing.assert_array_equal(reopened.get_many(["a"])[0], [1.0] * DIM)
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from llm_client import LLMClient
+
+# Pruebas de llm_client.py con un modelo falso: reintentos, deadline, modelo
+# de respaldo y cancelacion de la llamada perdedora del hedging.
+# Uso (desde logic_layer/): python -m pytest -q test_llm_client.py
+
+class ResourceExhausted(Exception):
+    """Hace las veces del 429 de google-api-core (se reconoce por nombre)."""
+
+class FakeModel:
+    """
+    Modelo con guion: cada llamada a ainvoke consume el siguiente paso. Un paso
+    es una excepcion (se lanza), un numero (segundos de espera antes de
+    responder) o cualquier otro valor (se devuelve).
+    """
+    def __init__(self, *steps, name="modelo"):
+        self.steps = list(steps)
+        self.name = name
+        self.calls = 0
+        self.cancelled = 0
+
+    async def ainvoke(self, prompt_value):
+        step = self.steps[min(self.calls, len(self.steps) - 1)]
+        self.calls += 1
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, (int, float)):
+            try:
+                await asyncio.sleep(step)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return f"{self.name}:{self.calls}"
+        return step
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_retries_transient_error():
+    model = FakeModel(ConnectionError("reset"), "ok")
+    client = LLMClient(lambda: model, max_retries=2, retry_base=0.01)
+    assert run(client.ainvoke("prompt")) == "ok"
+    assert model.calls == 2
+
+def test_does_not_retry_non_transient_error():
+    model = FakeModel(ValueError("prompt invalido"), "ok")
+    client = LLMClient(lambda: model, max_retries=2, retry_base=0.01)
+    with pytest.raises(ValueError):
+        run(client.ainvoke("prompt"))
+    assert model.calls == 1
+
+def test_no_retry_once_the_deadline_is_spent():
+    # El intento agota el deadline por timeout: no queda tiempo para reintentar
+    model = FakeModel(1.0)
+    client = LLMClient(lambda: model, deadline=0.1, max_retries=2, retry_base=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        run(client.ainvoke("prompt"))
+    assert model.calls == 1
+
+def test_no_retry_when_backoff_exceeds_the_deadline():
+    model = FakeModel(ResourceExhausted("429"), "ok")
+    client = LLMClient(lambda: model, deadline=0.2, max_retries=2, retry_base=1.0)
+    with pytest.raises(ResourceExhausted):
+        run(client.ainvoke("prompt"))
+    assert model.calls == 1
+
+def test_fallback_after_primary_fails():
+    primary = FakeModel(ResourceExhausted("429"))
+    fallback = FakeModel("respaldo")
+    client = LLMClient(lambda: primary, fallback=lambda: fallback, max_retries=1, retry_base=0.01)
+    assert run(client.ainvoke("prompt")) == "respaldo"
+    assert primary.calls == 2 and fallback.calls == 1
+
+def test_no_fallback_for_non_transient_error():
+    primary = FakeModel(ValueError("prompt invalido"))
+    fallback = FakeModel("respaldo")
+    client = LLMClient(lambda: primary, fallback=lambda: fallback, max_retries=1, retry_base=0.01)
+    with pytest.raises(ValueError):
+        run(client.ainvoke("prompt"))
+    assert fallback.calls == 0
+
+def test_hedge_returns_faster_call_and_cancels_slower():
+    # La primera llamada se cuelga; la duplicada responde enseguida
+    model = FakeModel(5.0, 0.0)
+    client = LLMClient(lambda: model, hedge=True, hedge_min_delay=0.05, hedge_min_samples=5)
+    client.latencies.extend([0.01] * 5)
+
+    async def scenario():
+        result = await asyncio.wait_for(client.ainvoke("prompt"), timeout=2)
+        await asyncio.sleep(0)
+        # Se mide aqui: al cerrar el loop asyncio.run cancelaria igual lo pendiente
+        return result, model.cancelled
+
+    assert run(scenario()) == ("modelo:2", 1)
+    assert model.calls == 2
+
+def test_no_hedge_without_enough_samples():
+    model = FakeModel(0.1)
+    client = LLMClient(lambda: model, hedge=True, hedge_min_delay=0.01, hedge_min_samples=5)
+    assert run(client.ainvoke("prompt")) == "modelo:1"
+    assert model.calls == 1
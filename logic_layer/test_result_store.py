@@ -0,0 +1,94 @@
+import os
+import json
+import time
+
+import pytest
+
+from result_store import ResultStore
+
+# Pruebas de result_store.py con dos ResultStore sobre la misma carpeta, como
+# dos workers de gunicorn: rotacion, archivos de escritores vivos, lectura
+# cruzada y lineas cortadas.
+# Uso (desde logic_layer/): python -m pytest -q test_result_store.py
+
+PAYLOAD = {"question": "¿Qué pasó en abril?", "synthesis": "x" * 40}
+
+def flush(store, timeout=2.0):
+    """Espera a que el hilo escritor lleve al disco todo lo encolado."""
+    limit = time.monotonic() + timeout
+    while store.stats()["pending"] or not store._queue.empty():
+        assert time.monotonic() < limit, "el escritor no vacio la cola"
+        time.sleep(0.005)
+
+def result_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".jsonl"))
+
+@pytest.fixture
+def stores(tmp_path):
+    opened = []
+
+    def open_store(**kwargs):
+        store = ResultStore(str(tmp_path), **kwargs)
+        opened.append(store)
+        return store
+
+    yield open_store
+    for store in opened:
+        store.close()
+
+def test_rotation_keeps_at_most_max_files(tmp_path, stores):
+    first = stores(max_file_bytes=300, max_files=3)
+    second = stores(max_file_bytes=300, max_files=3)
+    for i in range(20):
+        first.record(f"q{i}", PAYLOAD)
+        flush(first)
+        second.record(f"q{i}", PAYLOAD)
+        flush(second)
+    assert len(result_files(tmp_path)) <= 3
+
+def test_live_writer_file_is_never_pruned(tmp_path, stores):
+    # Serie sin pid (formato anterior): nadie la escribe y se puede borrar
+    (tmp_path / "results-old-0001.jsonl").write_text("")
+    idle = stores()
+    kept_id = idle.record("q", PAYLOAD)
+    flush(idle)
+    idle_file = idle._current
+
+    busy = stores(max_file_bytes=300, max_files=1)
+    for i in range(10):
+        busy.record(f"q{i}", PAYLOAD)
+        flush(busy)
+
+    files = result_files(tmp_path)
+    assert idle_file in files
+    assert "results-old-0001.jsonl" not in files
+    assert busy.get(kept_id)["id"] == kept_id
+
+def test_get_finds_records_written_by_the_other_store(stores):
+    writer = stores()
+    reader = stores()
+    result_id = writer.record("hash-abril", PAYLOAD)
+    flush(writer)
+
+    record = reader.get(result_id)
+    assert record["id"] == result_id and record["synthesis"] == PAYLOAD["synthesis"]
+    # Tambien por hash de pregunta: la respuesta mas reciente
+    newer_id = writer.record("hash-abril", PAYLOAD)
+    flush(writer)
+    assert reader.get("hash-abril")["id"] == newer_id
+    assert reader.get("no-existe") is None
+
+def test_truncated_last_line_is_skipped(tmp_path, stores):
+    complete = json.dumps({"id": "a" * 16, "question_hash": "q1", "created_at": 1.0, **PAYLOAD}) + "\n"
+    partial = json.dumps({"id": "b" * 16, "question_hash": "q2", "created_at": 2.0, **PAYLOAD})
+    path = tmp_path / "results-old-0001.jsonl"
+    path.write_text(complete + partial[:30], encoding="utf-8")
+
+    store = stores()
+    assert store.get("a" * 16)["question_hash"] == "q1"
+    assert store.get("b" * 16) is None
+    assert store.stats()["results"] == 1
+
+    # Cuando la linea termina de escribirse, el proximo refresh la indexa
+    path.write_text(complete + partial + "\n", encoding="utf-8")
+    assert store.get("b" * 16)["question_hash"] == "q2"
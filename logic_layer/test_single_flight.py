@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+# Pruebas de single_flight.py: deduplicacion, cancelacion cuando se va el
+# ultimo cliente, propagacion del error de `started` (429) y repeticion del
+# historial para quien se une tarde a un stream.
+# Uso (desde logic_layer/): python -m pytest -q test_single_flight.py
+
+class QueueFull(Exception):
+    """Hace las veces del HTTPException 429 de main.concurrency_slot."""
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_concurrent_requests_share_one_execution():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def work(flight):
+            calls.append(flight.key)
+            flight.mark_started()
+            await asyncio.sleep(0.01)
+            return "respuesta"
+
+        leader = flights.start("q", work)
+        flights.attach(leader)
+        follower = flights.get("q")
+        flights.join(follower)
+        flights.attach(follower)
+
+        results = await asyncio.gather(flights.wait(leader), flights.wait(follower))
+        return results, calls, flights.stats()
+
+    results, calls, stats = run(scenario())
+    assert results == ["respuesta", "respuesta"]
+    assert calls == ["q"]
+    assert stats["executions"] == 1 and stats["coalesced"] == 1
+    assert stats["in_flight"] == 0
+
+def test_finished_flight_is_not_reused():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work(flight):
+            return len(flights.flights)
+
+        flight = flights.start("q", work)
+        flights.attach(flight)
+        await flights.wait(flight)
+        return flights.get("q")
+
+    assert run(scenario()) is None
+
+def test_execution_cancelled_when_last_waiter_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def work(flight):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        flight = flights.start("q", work)
+        flights.attach(flight)
+        flights.attach(flight)
+        first = asyncio.create_task(flights.wait(flight))
+        second = asyncio.create_task(flights.wait(flight))
+        await asyncio.sleep(0)
+
+        # Se va uno: la ejecucion sigue para el otro
+        first.cancel()
+        await asyncio.sleep(0.01)
+        still_running = not flight.task.done()
+
+        second.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        await asyncio.sleep(0)
+        return still_running, flight.result.cancelled(), flights.get("q")
+
+    still_running, result_cancelled, remaining = run(scenario())
+    assert still_running
+    assert result_cancelled
+    assert remaining is None
+
+def test_started_propagates_error_raised_before_slot():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work(flight):
+            raise QueueFull("Servidor saturado")
+
+        flight = flights.start("q", work, streaming=True)
+        flights.attach(flight)
+        with pytest.raises(QueueFull):
+            await asyncio.shield(flight.started)
+        with pytest.raises(QueueFull):
+            await flights.wait(flight)
+        return flight.events.closed
+
+    assert run(scenario())
+
+def test_started_resolves_before_result():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def work(flight):
+            flight.mark_started()
+            await release.wait()
+            return "ok"
+
+        flight = flights.start("q", work)
+        flights.attach(flight)
+        await asyncio.wait_for(asyncio.shield(flight.started), timeout=1)
+        pending = not flight.result.done()
+        release.set()
+        return pending, await flights.wait(flight)
+
+    assert run(scenario()) == (True, "ok")
+
+def test_late_joiner_replays_history_then_live_events():
+    async def scenario():
+        flights = SingleFlight()
+        step = asyncio.Event()
+
+        async def work(flight):
+            flight.mark_started()
+            flight.events.publish("log:Survivor")
+            flight.events.publish("log:Speculator")
+            await step.wait()
+            flight.events.publish("synthesis")
+            return "ok"
+
+        flight = flights.start("q", work, streaming=True)
+        flights.attach(flight)
+        await asyncio.shield(flight.started)
+        await asyncio.sleep(0)
+
+        # Se une despues de los dos primeros eventos
+        late = flights.get("q")
+        flights.join(late)
+        flights.attach(late)
+        received = []
+
+        async def consume():
+            async for event in late.events.subscribe():
+                received.append(event)
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        replayed = list(received)
+        step.set()
+        await asyncio.wait_for(consumer, timeout=1)
+        await flights.wait(flight)
+        flights.detach(late)
+        return replayed, received
+
+    replayed, received = run(scenario())
+    assert replayed == ["log:Survivor", "log:Speculator"]
+    assert received == ["log:Survivor", "log:Speculator", "synthesis"]
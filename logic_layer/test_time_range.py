@@ -0,0 +1,61 @@
+import calendar
+
+import pytest
+
+from agents import detect_time_range, build_where
+
+# Pruebas del filtro temporal de agents.py (detect_time_range), que tambien
+# forma parte de la clave del cache de respuestas.
+# Uso (desde logic_layer/): python -m pytest -q test_time_range.py
+
+def month_range(first, last, year=2020):
+    end_year, end_month = (year + 1, 1) if last == 12 else (year, last + 1)
+    return (calendar.timegm((year, first, 1, 0, 0, 0)), calendar.timegm((end_year, end_month, 1, 0, 0, 0)))
+
+@pytest.mark.parametrize("question, expected", [
+    ("¿Qué pasó en la bolsa en abril?", month_range(4, 4)),
+    ("¿Qué pasó en la bolsa en mayo?", month_range(5, 5)),
+    ("What happened in May?", month_range(5, 5)),
+    ("¿Cómo cambió el miedo entre abril y junio?", month_range(4, 6)),
+    ("between April and May", month_range(4, 5)),
+    ("mid-May protests", month_range(5, 5)),
+    ("From March to April", month_range(3, 4)),
+    ("Marzo y abril", month_range(3, 4)),
+    ("What did people say in December 2019?", month_range(12, 12, year=2019)),
+    ("may 2020 stocks", month_range(5, 5)),
+])
+def test_detects_mentioned_months(question, expected):
+    assert detect_time_range(question) == expected
+
+@pytest.mark.parametrize("question", [
+    "May I ask what happened with the virus?",
+    "We may see a crash soon",
+    "They planned to march on the capital",
+    "March on, said the speculators",
+    "¿Qué opinas de Death Stranding?",
+])
+def test_ignores_questions_without_a_month(question):
+    assert detect_time_range(question) is None
+
+def test_year_applies_to_the_month_it_follows():
+    # El año explicito no se extiende a un mes posterior que no lo lleva
+    assert detect_time_range("December 2019 and March") == (
+        calendar.timegm((2019, 12, 1, 0, 0, 0)), calendar.timegm((2020, 4, 1, 0, 0, 0)))
+
+def test_bare_month_takes_the_year_of_the_next_dated_month():
+    assert detect_time_range("between March and April 2019") == month_range(3, 4, year=2019)
+
+def test_year_not_next_to_a_month_is_ignored():
+    assert detect_time_range("after the 2008 crisis in April") == month_range(4, 4)
+
+def test_april_and_may_questions_get_different_ranges():
+    assert detect_time_range("¿Qué pasó en la bolsa en abril?") != detect_time_range("¿Qué pasó en la bolsa en mayo?")
+
+def test_build_where_adds_epoch_bounds():
+    time_range = month_range(4, 4)
+    assert build_where("speculator_context") == {"source": "speculator_context"}
+    assert build_where("speculator_context", time_range) == {"$and": [
+        {"source": "speculator_context"},
+        {"epoch": {"$gte": time_range[0]}},
+        {"epoch": {"$lt": time_range[1]}}
+    ]}
@@ -0,0 +1,49 @@
+import math
+
+from diversity import URL_RE
+
+# Control del tamaño de los prompts. No hay tokenizer local de Gemini, asi que
+# los tokens se estiman por caracteres (~4 por token en ingles y español); la
+# cifra real la reporta el modelo en usage_metadata despues de cada llamada.
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def compact_text(text):
+    """Colapsa saltos de linea, sangrias y espacios repetidos en un solo espacio."""
+    return " ".join(text.split())
+
+def compress_document(text):
+    """Quita lo que no aporta al LLM (URLs, espacios de mas) antes de contar tokens."""
+    return compact_text(URL_RE.sub(" ", text))
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    # Cortamos en el ultimo espacio para no dejar palabras a medias
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip(" ,;:") + "…"
+
+def fit_to_budget(documents, budget_tokens):
+    """
+    Comprime los documentos y los recorta para que juntos no pasen de
+    budget_tokens. El presupuesto se reparte en partes iguales y lo que no usan
+    los documentos cortos pasa a los largos, asi ninguno desaparece entero.
+    Devuelve los documentos en el orden original.
+    """
+    compressed = [compress_document(doc) for doc in documents]
+    if budget_tokens <= 0 or sum(estimate_tokens(doc) for doc in compressed) <= budget_tokens:
+        return compressed
+
+    fitted = list(compressed)
+    remaining = budget_tokens
+    by_length = sorted(range(len(compressed)), key=lambda i: len(compressed[i]))
+    for position, i in enumerate(by_length):
+        share = remaining // (len(by_length) - position)
+        fitted[i] = truncate_to_tokens(compressed[i], share)
+        remaining -= estimate_tokens(fitted[i])
+    return fitted
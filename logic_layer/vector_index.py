@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+# Indice vectorial en proceso para 'project_archive'. Chroma sigue siendo la
+# fuente de verdad: al arrancar se descarga cada particion (source_filter) una
+# sola vez, se normaliza y se guarda como snapshot local (.npy + .json). Las
+# consultas se resuelven con un producto punto vectorizado sobre la matriz
+# mapeada en memoria, sin ir a la red ni pasar por el filtro `where` de Chroma.
+
+class Partition:
+    def __init__(self, embeddings, ids, documents, metadatas, fingerprint):
+        self.embeddings = embeddings  # float32 (n, dim), filas normalizadas
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.fingerprint = fingerprint
+        # Epoch de cada documento (-1 si no tiene fecha) para filtrar por periodo
+        self.epochs = np.array([(m or {}).get("epoch", -1) for m in metadatas], dtype=np.int64)
+
+class LocalVectorIndex:
+    def __init__(self, collection, snapshot_dir, page_size=5000):
+        self.collection = collection
+        self.snapshot_dir = snapshot_dir
+        self.page_size = page_size
+        self.partitions = {}
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    # --- CARGA ---
+
+    def load(self, source_tags):
+        for tag in source_tags:
+            self._load_partition(tag)
+
+    def refresh(self, force=False):
+        """
+        Vuelve a sincronizar las particiones cuyo contenido cambio en Chroma.
+        Devuelve la lista de particiones recargadas.
+        """
+        reloaded = []
+        for tag in list(self.partitions.keys()):
+            current = self.partitions[tag]
+            if force or self._remote_fingerprint(tag) != current.fingerprint:
+                self._load_partition(tag, force=True)
+                reloaded.append(tag)
+        return reloaded
+
+    def _load_partition(self, tag, force=False):
+        npy_path, meta_path = self._snapshot_paths(tag)
+        fingerprint = self._remote_fingerprint(tag)
+
+        if not force and os.path.exists(npy_path) and os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["fingerprint"] == fingerprint:
+                partition = self._open_snapshot(npy_path, meta)
+                # Si otro worker reemplazo el .npy y el .json por separado, no coinciden
+                if len(partition.embeddings) == len(meta["ids"]):
+                    print(f"   📦 Índice local '{tag}' cargado desde snapshot ({len(meta['ids'])} docs).")
+                    self.partitions[tag] = partition
+                    return
+
+        print(f"   ⬇️  Descargando partición '{tag}' desde Chroma...")
+        ids, documents, metadatas, embeddings = self._download(tag)
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        # Guardamos primero en archivos temporales para no dejar snapshots a medias.
+        # Con gunicorn varios workers descargan a la vez a la misma carpeta: cada
+        # proceso usa sus propios temporales y os.replace deja el del ultimo.
+        suffix = f"{os.getpid()}.tmp"
+        np.save(f"{npy_path}.{suffix}.npy", matrix)
+        meta = {"fingerprint": fingerprint, "ids": ids, "documents": documents, "metadatas": metadatas}
+        with open(f"{meta_path}.{suffix}", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(f"{npy_path}.{suffix}.npy", npy_path)
+        os.replace(f"{meta_path}.{suffix}", meta_path)
+
+        # Swap atomico: las consultas en curso siguen usando la particion anterior
+        self.partitions[tag] = self._open_snapshot(npy_path, meta)
+        print(f"   ✅ Partición '{tag}' indexada ({len(ids)} docs).")
+
+    def _open_snapshot(self, npy_path, meta):
+        embeddings = np.load(npy_path, mmap_mode="r")
+        return Partition(embeddings, meta["ids"], meta["documents"], meta["metadatas"], meta["fingerprint"])
+
+    def _download(self, tag):
+        ids, documents, metadatas, embeddings = [], [], [], []
+        offset = 0
+        while True:
+            page = self.collection.get(
+                where={"source": tag},
+                limit=self.page_size,
+                offset=offset,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            embeddings.extend(np.asarray(page["embeddings"], dtype=np.float32))
+            offset += len(page["ids"])
+        return ids, documents, metadatas, embeddings
+
+    def _remote_fingerprint(self, tag):
+        """Huella del contenido de la particion en Chroma (hash de sus ids)."""
+        result = self.collection.get(where={"source": tag}, include=[])
+        digest = hashlib.sha1()
+        for doc_id in sorted(result["ids"]):
+            digest.update(doc_id.encode("utf-8"))
+        return f"{len(result['ids'])}:{digest.hexdigest()}"
+
+    def _snapshot_paths(self, tag):
+        return (
+            os.path.join(self.snapshot_dir, f"{tag}.npy"),
+            os.path.join(self.snapshot_dir, f"{tag}.json")
+        )
+
+    # --- CONSULTA ---
+
+    def query(self, query_embedding, source_tag, n_results, include_embeddings=False, time_range=None):
+        """
+        Devuelve (documentos, metadatos, embeddings o None) de los n_results mas
+        similares. time_range=(inicio, fin) en epoch limita la busqueda a [inicio, fin).
+        """
+        partition = self.partitions.get(source_tag)
+        if partition is None or not partition.ids:
+            return [], [], None
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        if time_range is not None:
+            # Solo se calcula la similitud de las filas del periodo
+            rows = np.flatnonzero((partition.epochs >= time_range[0]) & (partition.epochs < time_range[1]))
+            if not len(rows):
+                return [], [], None
+            scores = partition.embeddings[rows] @ query
+        else:
+            rows = None
+            scores = partition.embeddings @ query
+
+        k = min(n_results, len(scores))
+        # argpartition es O(n); solo ordenamos los k mejores
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            top = rows[top]
+        embeddings = np.asarray(partition.embeddings[top]) if include_embeddings else None
+        return [partition.documents[i] for i in top], [partition.metadatas[i] for i in top], embeddings
+
+    def stats(self):
+        return {tag: len(p.ids) for tag, p in self.partitions.items()}
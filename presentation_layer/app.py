@@ -1,12 +1,69 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 import requests
+from requests.adapters import HTTPAdapter
+import os
+import json
+import uuid
+
+from circuit_breaker import CircuitBreaker
 
 app = Flask(__name__)
 
 # --- CONFIGURACIÓN ---
-# IP de tu Logic Layer (Igual que antes)
-LOGIC_HOST_IP = "172.31.70.154"
-API_URL = f"http://{LOGIC_HOST_IP}:5000/ask"
+# IP y puerto de tu Logic Layer
+LOGIC_HOST_IP = os.getenv("LOGIC_HOST_IP", "172.31.70.154")
+LOGIC_PORT = os.getenv("LOGIC_PORT", "5000")
+API_URL = f"http://{LOGIC_HOST_IP}:{LOGIC_PORT}/ask"
+STREAM_API_URL = f"http://{LOGIC_HOST_IP}:{LOGIC_PORT}/ask/stream"
+
+# Timeouts hacia el Logic Layer: conexion y espera entre fragmentos de la respuesta
+CONNECT_TIMEOUT = float(os.getenv("LOGIC_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("LOGIC_READ_TIMEOUT", "60"))
+
+# Maximo de llamadas simultaneas al Logic Layer desde este proceso. Por encima
+# de ese numero (o con el circuito abierto) se sirve la respuesta degradada.
+MAX_UPSTREAM_IN_FLIGHT = int(os.getenv("MAX_UPSTREAM_IN_FLIGHT", "64"))
+
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("BREAKER_RESET_TIMEOUT", "30")),
+    max_in_flight=MAX_UPSTREAM_IN_FLIGHT
+)
+
+def build_session():
+    """Sesion HTTP con pool de conexiones keep-alive (una conexion TCP reutilizada por llamada)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_UPSTREAM_IN_FLIGHT)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+logic_session = build_session()
+
+def is_upstream_failure(status_code):
+    """429 (Logic Layer saturado) y 5xx cuentan como fallo para el circuit breaker."""
+    return status_code == 429 or status_code >= 500
+
+# Cabeceras para que ni Flask ni un proxy intermedio (nginx) acumulen el stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.before_request
+def assign_request_id():
+    """ID de la peticion, se reenvia al Logic Layer para rastrearla en ambos servicios"""
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+
+@app.after_request
+def expose_request_id(response):
+    response.headers["X-Request-ID"] = g.request_id
+    return response
+
+def upstream_headers():
+    return {"X-Request-ID": g.request_id}
+
+@app.route('/health')
+def health():
+    """Estado del proceso y del circuito hacia el Logic Layer"""
+    return jsonify({"status": "ok", "logic_layer": breaker.stats()})
 
 @app.route('/')
 def home():
@@ -25,20 +82,100 @@ def ask_logic_layer():
     if not user_query:
         return jsonify({"error": "No query provided"}), 400
 
+    permit = breaker.try_acquire()
+    if permit is None:
+        # Logic Layer caido o saturado: respuesta degradada inmediata en vez de hacer cola
+        return jsonify(generate_mock_response(user_query))
+
+    success = False
     try:
         # Hacemos la petición al servicio de IA (Logic Layer)
-        response = requests.post(API_URL, json={"question": user_query}, timeout=60)
-        
+        response = logic_session.post(API_URL, json={"question": user_query}, headers=upstream_headers(),
+                                      timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        success = not is_upstream_failure(response.status_code)
+
         if response.status_code == 200:
             return jsonify(response.json())
+        elif response.status_code == 429:
+            return jsonify(generate_mock_response(user_query))
         else:
+            print(f"❌ [{g.request_id}] Logic Layer respondió {response.status_code}")
             return jsonify({"error": f"Logic Layer Error: {response.status_code}"}), 500
 
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         # Mock/Simulación por si la API real está apagada (Para que puedas probar la UI)
         return jsonify(generate_mock_response(user_query))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        breaker.release(permit, success)
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_logic_layer_stream():
+    """
+    Proxy de Server-Sent-Events: reenvia al navegador cada evento del Logic Layer
+    en cuanto llega, sin esperar la respuesta completa.
+    """
+    data = request.json
+    user_query = data.get('question')
+
+    if not user_query:
+        return jsonify({"error": "No query provided"}), 400
+
+    permit = breaker.try_acquire()
+    if permit is None:
+        return Response(generate_mock_stream(user_query), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+    try:
+        # (timeout de conexion, timeout entre fragmentos) -> el stream puede durar mas de READ_TIMEOUT en total
+        upstream = logic_session.post(STREAM_API_URL, json={"question": user_query}, headers=upstream_headers(),
+                                      stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        breaker.release(permit, False)
+        return Response(generate_mock_stream(user_query), mimetype='text/event-stream', headers=SSE_HEADERS)
+    except Exception as e:
+        breaker.release(permit, False)
+        return jsonify({"error": str(e)}), 500
+
+    if upstream.status_code != 200:
+        print(f"❌ [{g.request_id}] Logic Layer respondió {upstream.status_code}")
+        upstream.close()
+        breaker.release(permit, not is_upstream_failure(upstream.status_code))
+        if upstream.status_code == 429:
+            return Response(generate_mock_stream(user_query), mimetype='text/event-stream', headers=SSE_HEADERS)
+        return jsonify({"error": f"Logic Layer Error: {upstream.status_code}"}), upstream.status_code
+
+    # Solo un corte del lado del Logic Layer cuenta como fallo; si es el navegador
+    # el que cierra la conexion a mitad del stream el upstream no tuvo la culpa.
+    outcome = {"failed": False}
+
+    def relay():
+        try:
+            # chunk_size=None entrega los bytes tal como llegan del socket
+            for chunk in upstream.iter_content(chunk_size=None):
+                if chunk:
+                    yield chunk
+        except requests.exceptions.RequestException:
+            outcome["failed"] = True
+            raise
+
+    def finish():
+        # El cupo del breaker se mantiene mientras dure el stream. call_on_close corre
+        # siempre, incluso si el navegador se desconecta antes de recibir el primer byte.
+        upstream.close()
+        breaker.release(permit, not outcome["failed"])
+
+    response = Response(stream_with_context(relay()), mimetype='text/event-stream', headers=SSE_HEADERS)
+    response.call_on_close(finish)
+    return response
+
+def generate_mock_stream(query):
+    """Emite la respuesta simulada con el mismo formato de eventos que el stream real"""
+    mock = generate_mock_response(query)
+    for log in mock["logs"]:
+        yield f"event: agent\ndata: {json.dumps(log, ensure_ascii=False)}\n\n"
+    yield f"event: synthesis\ndata: {json.dumps({'synthesis': mock['synthesis']}, ensure_ascii=False)}\n\n"
+    yield f"event: done\ndata: {json.dumps({'degraded': True})}\n\n"
 
 def generate_mock_response(query):
     """Genera datos falsos para probar la interfaz si el backend falla"""
@@ -49,8 +186,10 @@ def generate_mock_response(query):
             {"agent": "Speculator", "thought": f"El riesgo calculado excede el margen. {lorem}", "context_used": ["Table 1"]},
             {"agent": "Auteur", "thought": f"La narrativa colapsa sobre sí misma. {lorem}", "context_used": ["Essay 4"]},
         ],
-        "synthesis": f"El Historiador concluye: La disonancia es total. {lorem}"
+        "synthesis": f"El Historiador concluye: La disonancia es total. {lorem}",
+        "degraded": True
     }
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8501)
\ No newline at end of file
+    # Servidor de desarrollo; en el contenedor corre gunicorn con workers gevent (ver gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=8501, threaded=True)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import time
+import threading
+
+# Permisos que devuelve CircuitBreaker.try_acquire
+CALL = "call"
+PROBE = "probe"
+
+class CircuitBreaker:
+    """
+    Corta el trafico hacia el Logic Layer cuando esta caido o saturado.
+
+    - closed: las peticiones pasan normalmente. Tras `failure_threshold` fallos
+      seguidos (error de conexion, timeout, 429 o 5xx) el circuito se abre.
+    - open: durante `reset_timeout` segundos no se intenta ninguna peticion; el
+      llamador sirve la respuesta degradada de inmediato.
+    - half-open: pasado ese tiempo se deja pasar una sola peticion de prueba; si
+      sale bien se cierra el circuito, si falla vuelve a abrirse.
+
+    Ademas limita las llamadas simultaneas al upstream a `max_in_flight`: las que
+    excedan ese numero se degradan en vez de quedarse esperando en cola.
+
+    try_acquire() devuelve un permiso (CALL o PROBE, None = degradar) que se
+    entrega a release(). Solo el release de la peticion de prueba cierra o
+    reabre el circuito: una llamada lenta que empezo antes de abrirse no decide
+    el estado ni libera el turno de prueba de otra.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, max_in_flight=64):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_in_flight = max_in_flight
+        self.failures = 0
+        self.opened_at = None
+        self.in_flight = 0
+        self.probing = False
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def try_acquire(self):
+        """Reserva un cupo para llamar al upstream. Devuelve el permiso, o None = servir respuesta degradada."""
+        with self._lock:
+            state = self.state
+            if state == "open" or self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                return None
+            permit = CALL
+            if state == "half-open":
+                if self.probing:
+                    self.rejected += 1
+                    return None
+                self.probing = True
+                permit = PROBE
+            self.in_flight += 1
+            return permit
+
+    def release(self, permit, success):
+        """Libera el cupo de `permit` y registra el resultado de la llamada."""
+        with self._lock:
+            self.in_flight -= 1
+            if permit == PROBE:
+                self.probing = False
+            elif self.opened_at is not None:
+                return  # Empezo antes de abrirse el circuito: solo la prueba decide el estado
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if permit == PROBE or self.failures >= self.failure_threshold:
+                # Un fallo de la prueba en half-open vuelve a abrir el circuito por otro periodo
+                if self.opened_at is None:
+                    print(f"🔌 Circuit breaker abierto tras {self.failures} fallos seguidos del Logic Layer")
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected
+        }
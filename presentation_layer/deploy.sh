@@ -46,7 +46,8 @@ fi
 
 # 4. EJECUCIÓN (RUN)
 echo "🔥 Levantando contenedor..."
-docker run -d --name $CONTAINER_NAME -p $PORT:8501 $IMAGE_NAME
+# Si LOGIC_HOST_IP esta definida en el entorno se pasa al contenedor
+docker run -d --name $CONTAINER_NAME -p $PORT:8501 ${LOGIC_HOST_IP:+-e LOGIC_HOST_IP=$LOGIC_HOST_IP} $IMAGE_NAME
 
 
 echo "🌍 Tu app disponible en: http://localhost:$PORT"
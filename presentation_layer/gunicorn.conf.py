@@ -0,0 +1,15 @@
+# Configuracion de gunicorn para la capa de presentacion. Casi todo el tiempo de
+# una peticion se pasa esperando al Logic Layer (hasta decenas de segundos por
+# pregunta), asi que en vez de un hilo por usuario se usan workers gevent: cada
+# peticion es una greenlet y requests (parcheado por gevent) cede el control
+# mientras espera la red. Un solo worker sostiene cientos de streams abiertos.
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8501')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gevent"
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", "1000"))
+# Los streams SSE pueden durar mas que el timeout por defecto de gunicorn
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
@@ -4,7 +4,17 @@ let currentBook = null;
 let currentPage = 0;
 const CHARS_PER_PAGE = 650; // Reduje un poco para dar espacio al título en negrita
 
+// Clase CSS del lomo de cada libro segun el agente
+const BOOK_CLASSES = {
+    "Survivor": "survivor",
+    "Speculator": "speculator",
+    "Auteur": "auteur",
+    "The Historian": "historian"
+};
+
 // --- MOMENTO 1 -> 2: START ANALYSIS ---
+// Consume el stream SSE de /ask/stream: cada libro se habilita en cuanto
+// su agente termina, sin esperar al resto del debate.
 async function startAnalysis() {
     const query = document.getElementById('userQuery').value;
     const btn = document.getElementById('startBtn');
@@ -15,20 +25,23 @@ async function startAnalysis() {
     btn.disabled = true;
     btn.style.cursor = "wait";
 
+    appData = { synthesis: "", logs: [] };
+    resetBooks();
+    document.getElementById('books-container').classList.remove('hidden');
+
     try {
-        const response = await fetch('/ask', {
+        const response = await fetch('/ask/stream', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({ question: query })
         });
-        
-        const data = await response.json();
-        
-        if (data.error) throw new Error(data.error);
-        
-        appData = data; 
-        
-        document.getElementById('books-container').classList.remove('hidden');
+
+        if (!response.ok) {
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.error || `HTTP ${response.status}`);
+        }
+
+        await readEventStream(response, handleStreamEvent);
         
         btn.innerText = "Nueva Consulta"; 
         btn.disabled = false;
@@ -46,9 +59,70 @@ async function startAnalysis() {
     }
 }
 
+// --- LECTURA DEL STREAM (SSE sobre fetch) ---
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Los eventos SSE se separan por una linea en blanco
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = "message";
+            let dataLines = [];
+            rawEvent.split("\n").forEach(line => {
+                if (line.startsWith("event:")) eventName = line.slice(6).trim();
+                else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+            });
+            if (dataLines.length) onEvent(eventName, JSON.parse(dataLines.join("\n")));
+        }
+    }
+}
+
+function handleStreamEvent(eventName, data) {
+    if (eventName === "token") {
+        setBookState(data.agent, "writing");
+    } else if (eventName === "agent") {
+        appData.logs.push(data);
+        setBookState(data.agent, "ready");
+    } else if (eventName === "synthesis") {
+        appData.synthesis = data.synthesis;
+        setBookState("The Historian", "ready");
+    } else if (eventName === "error") {
+        throw new Error(data.error);
+    }
+}
+
+// --- ESTADO DE LOS LIBROS ---
+function resetBooks() {
+    document.querySelectorAll('.book-spine').forEach(el => el.classList.remove("ready", "writing"));
+    Object.keys(BOOK_CLASSES).forEach(agent => setBookState(agent, "pending"));
+}
+
+function setBookState(agentName, bookState) {
+    const spine = document.querySelector(`.book-spine.${BOOK_CLASSES[agentName]}`);
+    if (!spine || spine.classList.contains("ready")) return;
+    spine.classList.remove("pending", "writing");
+    spine.classList.add(bookState);
+}
+
+function isBookReady(agentName) {
+    if (agentName === "The Historian") return Boolean(appData.synthesis);
+    return appData.logs.some(l => l.agent === agentName);
+}
+
 // --- MOMENTO 2 -> 3: ABRIR LIBRO ---
 function openBook(agentName) {
     if (!appData) return alert("Primero debes comenzar el debate.");
+    if (!isBookReady(agentName)) return alert("Este agente aún está escribiendo...");
 
     currentBook = agentName;
     currentPage = 0;
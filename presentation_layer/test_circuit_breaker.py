@@ -0,0 +1,100 @@
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CALL, PROBE
+
+# Pruebas de circuit_breaker.py: apertura tras fallos seguidos, una sola
+# peticion de prueba en half-open (que solo ella cierra o reabre) y limite de
+# llamadas simultaneas.
+# Uso (desde presentation_layer/): python -m pytest -q test_circuit_breaker.py
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def make_breaker(monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return CircuitBreaker(**kwargs), clock
+
+def fail(breaker, times):
+    for _ in range(times):
+        permit = breaker.try_acquire()
+        assert permit == CALL
+        breaker.release(permit, success=False)
+
+def test_opens_after_consecutive_failures(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch, failure_threshold=3, reset_timeout=30)
+    fail(breaker, 2)
+    assert breaker.state == "closed"
+    fail(breaker, 1)
+    assert breaker.state == "open"
+    assert breaker.try_acquire() is None
+    assert breaker.stats()["rejected"] == 1
+
+def test_success_resets_failure_count(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch, failure_threshold=3)
+    fail(breaker, 2)
+    breaker.release(breaker.try_acquire(), success=True)
+    fail(breaker, 2)
+    assert breaker.state == "closed"
+
+def test_half_open_lets_a_single_probe_through(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch, failure_threshold=1, reset_timeout=30)
+    fail(breaker, 1)
+    clock.now += 30
+    assert breaker.state == "half-open"
+    probe = breaker.try_acquire()
+    assert probe == PROBE
+    assert breaker.try_acquire() is None  # Ya hay una prueba en curso
+
+    breaker.release(probe, success=True)
+    assert breaker.state == "closed"
+    assert breaker.try_acquire() == CALL and breaker.try_acquire() == CALL
+
+def test_failed_probe_reopens_for_another_period(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch, failure_threshold=1, reset_timeout=30)
+    fail(breaker, 1)
+    clock.now += 30
+    breaker.release(breaker.try_acquire(), success=False)
+
+    assert breaker.state == "open"
+    clock.now += 29
+    assert breaker.try_acquire() is None
+    clock.now += 1
+    assert breaker.try_acquire() == PROBE
+
+def test_limits_calls_in_flight(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch, max_in_flight=2)
+    first = breaker.try_acquire()
+    assert first and breaker.try_acquire()
+    assert breaker.try_acquire() is None
+    breaker.release(first, success=True)
+    assert breaker.try_acquire() == CALL
+    assert breaker.state == "closed"
+
+def test_late_call_does_not_end_the_probe(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch, failure_threshold=1, reset_timeout=30)
+    slow = breaker.try_acquire()  # Empieza con el circuito cerrado y tarda
+    fail(breaker, 1)
+    clock.now += 30
+    probe = breaker.try_acquire()
+    assert probe == PROBE
+
+    # La llamada lenta termina bien: no cierra el circuito ni libera la prueba
+    breaker.release(slow, success=True)
+    assert breaker.state == "half-open"
+    assert breaker.try_acquire() is None
+
+    breaker.release(probe, success=False)
+    assert breaker.state == "open"
+
+def test_late_failure_does_not_extend_the_open_period(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch, failure_threshold=1, reset_timeout=30)
+    slow = breaker.try_acquire()
+    fail(breaker, 1)
+    clock.now += 20
+    breaker.release(slow, success=False)
+    clock.now += 10
+    assert breaker.state == "half-open"